@@ -3,27 +3,33 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from utils.prompts import CODE_SYSTEM_PROMPT
+from utils.model_policy import default_policy, is_refusal
+from utils.cancellation import checkpoint
 
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
 class CodeAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=API_KEY)
-        self.model_name = "gemini-2.0-flash"
+    def __init__(self, client=None, policy=None, log=print):
+        self.client = client or genai.Client(api_key=API_KEY)
+        self.policy = policy or default_policy
+        self.log = log
+
+    def solve(self, problem: str, tier=None, cancel=None):
+        self.log(f"💻 Code Agent is solving: '{problem}'...")
+        checkpoint(cancel)
 
-    def solve(self, problem: str):
-        print(f"💻 Code Agent is solving: '{problem}'...")
-        
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=problem,
+            # Replies may be code and results with no text, so only refusals escalate.
+            response = self.policy.generate_with_escalation(
+                self.client, "code", problem,
+                check=lambda text: not is_refusal(text),
                 config=types.GenerateContentConfig(
                     tools=[{'code_execution': {}}],
                     response_modalities=["TEXT"], 
                     system_instruction=CODE_SYSTEM_PROMPT
-                )
+                ),
+                tier=tier
             )
             
             result_package = {
@@ -35,7 +41,7 @@ class CodeAgent:
                 result_package["text"] = "⚠️ No response generated."
                 return result_package
 
-            print(f"   -> Received {len(response.candidates[0].content.parts)} parts from Gemini.")
+            self.log(f"   -> Received {len(response.candidates[0].content.parts)} parts from Gemini.")
 
             for part in response.candidates[0].content.parts:
                 
@@ -43,17 +49,17 @@ class CodeAgent:
                     result_package["text"] += part.text + "\n\n"
                 
                 elif part.executable_code:
-                    print("   -> Code block detected.")
+                    self.log("   -> Code block detected.")
                     result_package["text"] += f"```python\n{part.executable_code.code}\n```\n"
                 
                 elif part.code_execution_result:
-                    print("   -> Execution Result detected.")
+                    self.log("   -> Execution Result detected.")
                     output = part.code_execution_result.output
                     result_package["text"] += f"**> Execution Result:**\n```\n{output}\n```\n"
                 
                 # Check for images
                 if hasattr(part, "inline_data") and part.inline_data:
-                    print("   -> Graph detected! 📊")
+                    self.log("   -> Graph detected! 📊")
                     result_package["images"].append(part.inline_data)
 
             return result_package
@@ -3,6 +3,11 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from utils.prompts import DOC_SYSTEM_PROMPT
+from utils import prompt_builder
+from utils.model_policy import default_policy, answer_check
+from utils.single_flight import SingleFlight, normalize_query
+from utils.doc_preprocessor import DocPreprocessor, file_key
+from utils.cancellation import checkpoint
 
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -11,33 +16,86 @@ from tools.pdf_tool import read_pdf
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# Shared by every DocAgent in the process: identical concurrent questions
+# about the same file make a single model call.
+_doc_flight = SingleFlight()
+
 class DocAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=API_KEY)
-        self.model_name = "gemini-2.0-flash"
-
-    def ask_pdf(self, pdf_path: str, question: str):
-        pdf_text = read_pdf(pdf_path)
-
-        full_prompt = f"""
-        {DOC_SYSTEM_PROMPT}
-        
-        DOCUMENT CONTENT:
-        {pdf_text}
-        
-        USER QUESTION:
-        {question}
+    def __init__(self, client=None, policy=None, preprocessor=None):
+        self.client = client or genai.Client(api_key=API_KEY)
+        self.policy = policy or default_policy
+        self.preprocessor = preprocessor or DocPreprocessor(self.client, self.policy)
+
+    def preload(self, pdf_path: str):
         """
+        Starts background pre-processing (text, outline, summaries) for a newly
+        loaded PDF. Returns immediately; see preprocessing_status().
+        """
+        self.preprocessor.start(pdf_path)
+
+    def preprocessing_status(self, pdf_path: str):
+        return self.preprocessor.status(pdf_path)
 
+    def ask_pdf(self, pdf_path: str, question: str, tier=None, cancel=None):
+        # Generic questions (summary, outline, key terms) from precomputed artifacts.
+        # An explicit tier asks for a fresh model answer.
+        if tier is None:
+            quick = self.preprocessor.quick_answer(pdf_path, question)
+            if quick is not None:
+                return quick
+        if cancel is not None:
+            # Not coalesced: cancelling a shared call would fail its followers.
+            return self._ask_pdf(pdf_path, question, tier, cancel)
+        # Same path but re-uploaded content must not share a call.
+        return _doc_flight.do((file_key(pdf_path), normalize_query(question), tier),
+                              self._ask_pdf, pdf_path, question, tier)
+
+    def ask_pdf_stream(self, pdf_path: str, question: str):
+        """
+        Like ask_pdf, but yields the answer in chunks as the model writes it.
+        Streams are per caller, so they are not coalesced.
+        """
+        quick = self.preprocessor.quick_answer(pdf_path, question)
+        if quick is not None:
+            yield quick
+            return
+
+        full_prompt, truncated = self._prompt(pdf_path, question)
+        try:
+            yield from self.policy.generate_stream(self.client, "doc", full_prompt)
+            note = self._truncation_note(truncated)
+            if note:
+                yield note
+        except Exception as e:
+            yield f"Error processing document: {str(e)}"
+
+    def _ask_pdf(self, pdf_path: str, question: str, tier=None, cancel=None):
+        full_prompt, truncated = self._prompt(pdf_path, question, tier)
+        checkpoint(cancel)
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=full_prompt
-            )
-            return response.text
+            response = self.policy.generate_with_escalation(self.client, "doc", full_prompt,
+                                                            check=answer_check, tier=tier)
+            return response.text + self._truncation_note(truncated)
         except Exception as e:
             return f"Error processing document: {str(e)}"
 
+    def _prompt(self, pdf_path, question, tier=None):
+        # Already extracted if the file was preloaded.
+        pdf_text = self.preprocessor.document_text(pdf_path) or read_pdf(pdf_path)
+        return prompt_builder.DOC_QA.build_with_report(
+            max_tokens=self.policy.prompt_budget("doc", tier=tier),
+            system=DOC_SYSTEM_PROMPT,
+            document=pdf_text,
+            question=question
+        )
+
+    def _truncation_note(self, truncated):
+        if "document" not in truncated:
+            return ""
+        kept_chars, total_chars = truncated["document"]
+        return (f"\n\n_⚠️ This document is longer than the model can read at once: "
+                f"only about the first {kept_chars / total_chars:.0%} was used, so later parts may be missing from this answer._")
+
 # --- Test Block ---
 if __name__ == "__main__":
     # To test this, we need a dummy PDF.
@@ -4,38 +4,76 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from utils.prompts import SEARCH_SYSTEM_PROMPT
+from utils.model_policy import default_policy, answer_check
+from utils.single_flight import SingleFlight, normalize_query
+from utils.cancellation import checkpoint
 
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# Shared by every SearchAgent in the process, so identical concurrent
+# questions (e.g. a trending topic) make a single model call.
+_search_flight = SingleFlight()
+
 class SearchAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=API_KEY)
-        self.model_name = "gemini-2.0-flash"
+    def __init__(self, client=None, policy=None, log=print):
+        self.client = client or genai.Client(api_key=API_KEY)
+        self.policy = policy or default_policy
+        self.log = log
         
         self.google_search_tool = types.Tool(
             google_search=types.GoogleSearch()
         )
 
-    def research(self, query: str):
-        print(f"🔎 Search Agent is looking up: '{query}'...")
+    def research(self, query: str, tier=None, cancel=None):
+        if cancel is not None:
+            # Not coalesced: cancelling a shared call would fail its followers.
+            return self._research(query, tier, cancel)
+        return _search_flight.do((normalize_query(query), tier), self._research, query, tier)
+
+    def research_stream(self, query: str):
+        """
+        Like research, but yields the answer in chunks as the model writes it.
+        429s are retried only until the first chunk arrives.
+        """
+        self.log(f"🔎 Search Agent is looking up: '{query}'...")
 
         max_retries = 3
         for attempt in range(max_retries):
+            started = False
             try:
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=query,
-                    config=types.GenerateContentConfig(
-                        tools=[self.google_search_tool],
-                        response_modalities=["TEXT"],
-                        system_instruction=SEARCH_SYSTEM_PROMPT # <--- INJECT PERSONA HERE
-                    )
+                for text in self.policy.generate_stream(self.client, "search", query, config=self._config()):
+                    started = True
+                    yield text
+                return
+
+            except Exception as e:
+                self.log(f"⚠️ Attempt {attempt + 1} failed: {e}")
+                if "429" in str(e) and not started:
+                    time.sleep(2)
+                else:
+                    yield f"Error performing search: {str(e)}"
+                    return
+
+        yield "Error: Search failed after maximum retries."
+
+    def _research(self, query: str, tier=None, cancel=None):
+        self.log(f"🔎 Search Agent is looking up: '{query}'...")
+
+        max_retries = 3
+        for attempt in range(max_retries):
+            checkpoint(cancel)
+            try:
+                response = self.policy.generate_with_escalation(
+                    self.client, "search", query,
+                    check=answer_check,
+                    config=self._config(),
+                    tier=tier
                 )
                 return response.text
 
             except Exception as e:
-                print(f"⚠️ Attempt {attempt + 1} failed: {e}")
+                self.log(f"⚠️ Attempt {attempt + 1} failed: {e}")
                 if "429" in str(e):
                     time.sleep(2) 
                 else:
@@ -43,6 +81,13 @@ class SearchAgent:
         
         return "Error: Search failed after maximum retries."
 
+    def _config(self):
+        return types.GenerateContentConfig(
+            tools=[self.google_search_tool],
+            response_modalities=["TEXT"],
+            system_instruction=SEARCH_SYSTEM_PROMPT # <--- INJECT PERSONA HERE
+        )
+
 if __name__ == "__main__":
     agent = SearchAgent()
     print(agent.research("Who won the 2024 Nobel Prize in Physics?"))
\ No newline at end of file
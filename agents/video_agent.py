@@ -1,41 +1,291 @@
 import os
+import re
+import subprocess
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from google import genai
-from utils.prompts import VIDEO_SYSTEM_PROMPT
+from utils.prompts import VIDEO_SYSTEM_PROMPT, VIDEO_SEGMENT_PROMPT, VIDEO_SUMMARY_QA_PROMPT
+from utils import prompt_builder
+from utils.model_policy import default_policy
+from utils.cancellation import checkpoint
+from utils.file_hash import file_hash
+from utils.video_cache import VIDEO_CACHE_FILE, get_segment_summary, save_segment_summary
 
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# Videos longer than this are split into segments instead of sent whole.
+LONG_VIDEO_SECONDS = 20 * 60
+SEGMENT_SECONDS = 10 * 60
+MAX_PARALLEL_SEGMENTS = 4
+# Segments re-watched per question at most, whatever the model asks for.
+MAX_REQUERY_SEGMENTS = 3
+
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def probe_duration(video_path):
+    """
+    Returns the video length in seconds using ffmpeg, or None if it can't be read.
+    """
+    try:
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-i", video_path],
+                                capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def keyframe_at_or_before(video_path, seconds):
+    """
+    Time of the last video keyframe at or before `seconds`: the first packet
+    ffmpeg returns when seeking there, in original timestamps. Returns
+    `seconds` unchanged if it can't be read.
+    """
+    if seconds <= 0:
+        return 0
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-ss", str(seconds), "-i", video_path,
+             "-map", "0:v:0", "-c", "copy", "-copyts", "-frames:v", "1", "-f", "framemd5", "-"],
+            capture_output=True, text=True
+        )
+    except FileNotFoundError:
+        return seconds
+    timebase = re.search(r"^#tb 0: (\d+)/(\d+)", result.stdout, re.MULTILINE)
+    packet = re.search(r"^0,\s*(-?\d+),", result.stdout, re.MULTILINE)
+    if not timebase or not packet:
+        return seconds
+    keyframe = int(packet.group(1)) * int(timebase.group(1)) / int(timebase.group(2))
+    return keyframe if 0 <= keyframe <= seconds else seconds
+
+def split_segment(video_path, start, end, out_dir):
+    """
+    Cuts [start, end) out of the video without re-encoding and returns the clip path.
+    A stream copy starts at the keyframe at or before `start`, so `start`
+    should be a keyframe (see plan_segments) for the clip to match its label.
+    """
+    ext = os.path.splitext(video_path)[1] or ".mp4"
+    out_path = os.path.join(out_dir, f"segment_{int(start)}_{int(end)}{ext}")
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+         "-ss", str(start), "-i", video_path, "-t", str(end - start),
+         "-c", "copy", out_path],
+        check=True, capture_output=True
+    )
+    return out_path
+
 class VideoAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=API_KEY)
-        self.model_name = "gemini-2.0-flash"
+    def __init__(self, client=None, segment_seconds=SEGMENT_SECONDS,
+                 max_workers=MAX_PARALLEL_SEGMENTS, cache_file=VIDEO_CACHE_FILE, policy=None, log=print):
+        self.client = client or genai.Client(api_key=API_KEY)
+        self.policy = policy or default_policy
+        self.log = log
+        self.segment_seconds = segment_seconds
+        self.max_workers = max_workers
+        self.cache_file = cache_file
 
-    def analyze_video(self, video_path: str, question: str):
+    def analyze_video(self, video_path: str, question: str, long_video=None, cancel=None):
         """
         Uploads a video file and asks Gemini questions about it.
+        Long videos (or long_video=True) go through the segmented path instead.
         """
-        print(f"🎥 Video Agent is watching: {video_path}...")
+        duration = None
+        if long_video is None:
+            duration = probe_duration(video_path)
+            long_video = duration is not None and duration > LONG_VIDEO_SECONDS
+        if long_video:
+            return self.analyze_long_video(video_path, question, duration=duration)
 
-        try:
-            video_file = self.client.files.upload(file=video_path)
-            
-            # 2. Wait for processing (Big files take a few seconds)
-            while video_file.state.name == "PROCESSING":
-                time.sleep(2)
-                video_file = self.client.files.get(name=video_file.name)
+        self.log(f"🎥 Video Agent is watching: {video_path}...")
+        checkpoint(cancel)  # Before the upload, the expensive part
 
+        try:
+            video_file = self._upload(video_path)
             if video_file.state.name == "FAILED":
                 return "⚠️ Video processing failed."
 
-            # 3. Ask the question using the System Prompt
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=[video_file, VIDEO_SYSTEM_PROMPT, question]
-            )
-            
+            # Ask the question using the System Prompt
+            response = self.policy.generate(self.client, "video", [video_file, VIDEO_SYSTEM_PROMPT, question])
+
             return response.text
 
         except Exception as e:
-            return f"Error analyzing video: {str(e)}"
\ No newline at end of file
+            return f"Error analyzing video: {str(e)}"
+
+    def analyze_long_video(self, video_path: str, question: str, duration=None):
+        """
+        Splits the video into segments, summarizes them in parallel (cached by
+        file hash + time range), answers from the summaries, and only re-watches
+        the segments the model asks for. Pass duration if already probed.
+        """
+        self.log(f"🎥 Video Agent is watching (long-video mode): {video_path}...")
+
+        try:
+            duration = duration or probe_duration(video_path)
+            if not duration:
+                return "⚠️ Could not read the video duration (is ffmpeg installed?)."
+
+            segments = self.plan_segments(duration, video_path)
+            summaries = self.summarize_segments(video_path, segments)
+
+            answer = self._answer_from_summaries(segments, summaries, question)
+            needed = self._needed_segments(answer, len(segments))
+            if needed is None:
+                return answer
+
+            if len(needed) > MAX_REQUERY_SEGMENTS:
+                self.log(f"   -> Model asked for {len(needed)} segments; keeping the first {MAX_REQUERY_SEGMENTS}.")
+                needed = sorted(needed[:MAX_REQUERY_SEGMENTS])
+            self.log(f"   -> Re-watching segments: {[i + 1 for i in needed]}")
+            return self._requery_segments(video_path, [segments[i] for i in needed], question)
+
+        except Exception as e:
+            return f"Error analyzing video: {str(e)}"
+
+    def plan_segments(self, duration, video_path=None):
+        """
+        Splits [0, duration) into segments of about segment_seconds. Given the
+        video, each cut moves back to a keyframe, so stream-copied clips start
+        exactly where their timestamps say.
+        """
+        segments = []
+        start = 0
+        while start < duration:
+            end = start + self.segment_seconds
+            if end >= duration:
+                end = duration
+            elif video_path:
+                keyframe = keyframe_at_or_before(video_path, end)
+                # No keyframe inside this segment: keep the nominal cut.
+                end = keyframe if keyframe > start else end
+            segments.append((start, end))
+            start = end
+        return segments
+
+    def summarize_segments(self, video_path, segments):
+        """
+        Returns one timestamped summary per segment, computing only the ones
+        missing from the cache, with at most max_workers uploads in flight.
+        """
+        video_hash = file_hash(video_path)
+        summaries = {}
+        missing = []
+        for start, end in segments:
+            cached = get_segment_summary(video_hash, start, end, self.cache_file)
+            if cached:
+                summaries[(start, end)] = cached["summary"]
+            else:
+                missing.append((start, end))
+
+        self.log(f"   -> {len(segments) - len(missing)}/{len(segments)} segment summaries cached.")
+
+        if missing:
+            with tempfile.TemporaryDirectory() as tmp_dir, \
+                    ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {
+                    pool.submit(self._summarize_segment, video_path, start, end, tmp_dir): (start, end)
+                    for start, end in missing
+                }
+                for future in as_completed(futures):
+                    start, end = futures[future]
+                    try:
+                        summary = future.result()
+                        save_segment_summary(video_hash, start, end, summary, self.cache_file)
+                    except Exception as e:
+                        # Leave it out of the cache so the next question retries it.
+                        summary = f"(Segment could not be analyzed: {e})"
+                    summaries[(start, end)] = summary
+
+        return [summaries[segment] for segment in segments]
+
+    def _upload(self, video_path):
+        video_file = self.client.files.upload(file=video_path)
+
+        # Wait for processing (Big files take a few seconds)
+        while video_file.state.name == "PROCESSING":
+            time.sleep(2)
+            video_file = self.client.files.get(name=video_file.name)
+
+        return video_file
+
+    def _upload_clip(self, video_path, start, end, tmp_dir):
+        clip_path = split_segment(video_path, start, end, tmp_dir)
+        clip_file = self._upload(clip_path)
+        if clip_file.state.name == "FAILED":
+            raise RuntimeError(f"Processing failed for {format_timestamp(start)} - {format_timestamp(end)}.")
+        return clip_file
+
+    def _summarize_segment(self, video_path, start, end, tmp_dir):
+        clip_file = self._upload_clip(video_path, start, end, tmp_dir)
+        prompt = VIDEO_SEGMENT_PROMPT.format(start=format_timestamp(start), end=format_timestamp(end))
+        response = self.policy.generate(self.client, "video", [clip_file, prompt])
+        return response.text
+
+    def _answer_from_summaries(self, segments, summaries, question):
+        notes = ""
+        for i, ((start, end), summary) in enumerate(zip(segments, summaries)):
+            notes += f"SEGMENT {i + 1} [{format_timestamp(start)} - {format_timestamp(end)}]:\n{summary}\n\n"
+
+        prompt = prompt_builder.VIDEO_NOTES_QA.build(
+            system=VIDEO_SUMMARY_QA_PROMPT, notes=notes, question=question
+        )
+        response = self.policy.generate(self.client, "video", prompt)
+        return response.text
+
+    def _needed_segments(self, answer, segment_count):
+        """
+        Parses 'NEED_SEGMENTS: 2, 5' into zero-based indices (in the order the
+        model listed them), or None if the summaries were enough.
+        """
+        match = re.search(r"NEED_SEGMENTS:\s*([\d,\s]+)", answer or "")
+        if not match:
+            return None
+        indices = []
+        for number in re.findall(r"\d+", match.group(1)):
+            i = int(number) - 1
+            if 0 <= i < segment_count and i not in indices:
+                indices.append(i)
+        return indices or None
+
+    def _requery_segments(self, video_path, segments, question):
+        """
+        Asks the question against each segment's clip in parallel. A segment
+        that fails is reported as such; the others' answers are still returned.
+        """
+        answers, failures = [], []
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [
+                pool.submit(self._ask_segment, video_path, start, end, question, tmp_dir)
+                for start, end in segments
+            ]
+            for (start, end), future in zip(segments, futures):
+                try:
+                    answers.append(((start, end), future.result()))
+                except Exception as e:
+                    failures.append(f"{format_timestamp(start)} - {format_timestamp(end)} ({e})")
+
+        if not answers:
+            return f"Error analyzing video: could not re-watch {'; '.join(failures)}."
+        if len(answers) == 1 and not failures:
+            return answers[0][1]
+        text = "\n\n".join(
+            f"**[{format_timestamp(start)} - {format_timestamp(end)}]**\n{answer}"
+            for (start, end), answer in answers
+        )
+        if failures:
+            text += f"\n\n_⚠️ Could not re-watch {'; '.join(failures)}, so this answer may be incomplete._"
+        return text
+
+    def _ask_segment(self, video_path, start, end, question, tmp_dir):
+        clip_file = self._upload_clip(video_path, start, end, tmp_dir)
+        clip_note = f"This clip covers {format_timestamp(start)} to {format_timestamp(end)} of the full video. Give timestamps in full-video time."
+        response = self.policy.generate(self.client, "video", [clip_file, VIDEO_SYSTEM_PROMPT, clip_note, question])
+        return response.text
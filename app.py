@@ -1,8 +1,14 @@
 import streamlit as st
+import hashlib
 import os
 import time
 from google import genai
 from utils.memory_store import load_memory, update_memory, delete_fact
+from utils.live_judge import LiveJudge
+from utils import prompt_builder
+from utils.model_policy import default_policy
+from utils.metrics_store import load_judgments, average_score
+from utils.file_hash import file_hash
 
 # Import Agents
 from agents.search_agent import SearchAgent
@@ -37,8 +43,15 @@ with st.sidebar:
     pdf_path = None
     if uploaded_pdf:
         pdf_path = f"temp_{uploaded_pdf.name}"
-        with open(pdf_path, "wb") as f:
-            f.write(uploaded_pdf.getbuffer())
+        # Rewriting on every rerun would change the mtime and restart pre-processing,
+        # so only write when the content differs from what is on disk. The upload
+        # is hashed once per file_id; the file on disk is memoized by file_hash.
+        if st.session_state.get("pdf_upload_hash", (None, None))[0] != uploaded_pdf.file_id:
+            st.session_state.pdf_upload_hash = (uploaded_pdf.file_id, hashlib.sha256(uploaded_pdf.getbuffer()).hexdigest())
+        upload_hash = st.session_state.pdf_upload_hash[1]
+        if not os.path.exists(pdf_path) or file_hash(pdf_path) != upload_hash:
+            with open(pdf_path, "wb") as f:
+                f.write(uploaded_pdf.getbuffer())
         st.success(f"Loaded: {uploaded_pdf.name}")
 
     uploaded_video = st.file_uploader("Upload Video", type=["mp4", "mov"])
@@ -77,6 +90,11 @@ with st.sidebar:
     # AI JUDGE TOGGLE
     st.header("⚙️ Advanced Settings")
     enable_judge = st.toggle("Enable AI Judge ⚖️", value=False, help="Ask a second AI to grade the response for accuracy.")
+    if enable_judge:
+        judge_sample_rate = st.slider("Judge sample rate", 0.0, 1.0, 1.0, 0.05, help="Fraction of your answers sent to the judge.")
+        judge_avg = average_score(load_judgments()[-50:])
+        if judge_avg is not None:
+            st.caption(f"Avg judge score (last 50): **{judge_avg:.1f}/5**")
     
     st.divider()
     if st.button("Clear Chat"):
@@ -97,33 +115,71 @@ def load_agents():
     }
 agents = load_agents()
 
+# --- BACKGROUND PDF PRE-PROCESSING ---
+# Starts on upload; summary/outline/key-term questions are then answered instantly.
+def show_preprocessing_result(status):
+    if status["error"]:
+        st.caption(f"⚠️ Pre-processing failed: {status['error']}")
+    else:
+        st.caption(f"✅ Pre-processed ({status['sections']} sections)")
+
+@st.fragment(run_every="1s")
+def render_preprocessing_progress(pdf_path):
+    status = agents["doc"].preprocessing_status(pdf_path)
+    if status and status["done"]:
+        st.rerun()  # Redraw the result statically so this fragment stops polling
+    if status:
+        st.progress(status["progress"], text=f"⏳ Pre-processing: {status['stage']}...")
+
+if pdf_path:
+    agents["doc"].preload(pdf_path)
+    with st.sidebar:
+        status = agents["doc"].preprocessing_status(pdf_path)
+        if status and status["done"]:
+            show_preprocessing_result(status)
+        else:
+            render_preprocessing_progress(pdf_path)
+
+# --- HELPER: THE LIVE JUDGE ---
+# Runs in the background so grading never delays the answer. Shared by every
+# browser session, so batching is server config (JUDGE_BATCH_SIZE) and each
+# session passes its own sample rate on submit.
+@st.cache_resource
+def load_judge():
+    return LiveJudge(client, batch_size=int(os.getenv("JUDGE_BATCH_SIZE", "4")))
+judge = load_judge()
+
+def take_verdict(msg):
+    """Moves a finished verdict from the shared judge into this session's message."""
+    if "verdict" not in msg:
+        verdict = judge.pop_verdict(msg["judge_id"])
+        if verdict:
+            msg["verdict"] = verdict
+    return msg.get("verdict")
+
+def show_verdict(verdict):
+    score = verdict["score"] if verdict["score"] is not None else "?"
+    st.info(f"SCORE: {score}\nREASON: {verdict['reason']}")
+
+@st.fragment(run_every="2s")
+def render_pending_verdict(msg):
+    if take_verdict(msg):
+        st.rerun()  # Redraw it statically so this fragment stops polling
+    st.caption("👨‍⚖️ The Judge is reviewing...")
+
+def render_verdict(msg):
+    verdict = take_verdict(msg)
+    if verdict:
+        show_verdict(verdict)
+    else:
+        render_pending_verdict(msg)
+
 # Display Chat History
 for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
-
-# --- HELPER: THE LIVE JUDGE ---
-def judge_response(user_query, agent_response):
-    judge_prompt = f"""
-    Act as an impartial AI Judge. Grade the following response.
-    
-    USER QUERY: "{user_query}"
-    AGENT RESPONSE: "{agent_response}"
-    
-    CRITERIA:
-    - Accuracy: Is the information correct?
-    - Helpfulness: Did it answer the user's intent?
-    - Safety: Is the content safe?
-    
-    OUTPUT FORMAT:
-    SCORE: [1-5]
-    REASON: [1 short sentence]
-    """
-    try:
-        eval_resp = client.models.generate_content(model="gemini-2.0-flash", contents=judge_prompt).text
-        return eval_resp
-    except:
-        return "SCORE: ?\nREASON: Judge fell asleep."
+        if msg.get("judge_id"):
+            render_verdict(msg)
 
 # --- CORE LOGIC ---
 if prompt := st.chat_input("Ask a question..."):
@@ -146,19 +202,16 @@ if prompt := st.chat_input("Ask a question..."):
 
         # 2. CONTEXTUALIZE
         status.markdown("🧠 Recalling context...")
-        history_text = ""
-        for msg in st.session_state.messages[-5:]:
-            history_text += f"{msg['role'].upper()}: {msg['content']}\n"
-            
-        context_prompt = f"""
-        Rewrite the LAST USER INPUT based on CHAT HISTORY.
-        CHAT HISTORY: {history_text}
-        LAST USER INPUT: "{prompt}"
-        INSTRUCTIONS: If user refers to "it/he/that", clarify. If standalone, keep as is.
-        REWRITTEN QUERY:
-        """
+        context_prompt = prompt_builder.REWRITE.build(
+            history=prompt_builder.format_history(st.session_state.messages[-5:]),
+            question=prompt
+        )
         try:
-            rewritten_resp = client.models.generate_content(model="gemini-2.0-flash", contents=context_prompt)
+            # Light tier; a stronger model only if the rewrite looks broken.
+            rewritten_resp = default_policy.generate_with_escalation(
+                client, "rewrite", context_prompt,
+                check=lambda text: bool(text and text.strip()) and len(text) < 4 * len(prompt) + 200
+            )
             final_query = rewritten_resp.text.strip()
         except:
             final_query = prompt
@@ -192,10 +245,12 @@ if prompt := st.chat_input("Ask a question..."):
             # General Chat
             status.markdown("🤔 Thinking...")
             memory_data = load_memory()
-            sys_prompt = f"You are a helpful study assistant. USER FACTS: {memory_data['facts']}"
-            response = client.models.generate_content(
-                model="gemini-2.0-flash", 
-                contents=f"{sys_prompt}\n\nUser Query: {final_query}"
+            response = default_policy.generate(
+                client, "chat",
+                prompt_builder.CHAT.build(
+                    memory=prompt_builder.format_facts(memory_data["facts"]),
+                    question=final_query
+                )
             ).text
 
         # 4. DISPLAY RESPONSE
@@ -206,11 +261,12 @@ if prompt := st.chat_input("Ask a question..."):
             for img_data in generated_images:
                 st.image(img_data.data, caption="Generated Visualization 📊")
 
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        assistant_msg = {"role": "assistant", "content": response}
+        st.session_state.messages.append(assistant_msg)
 
-        # 5. LIVE JUDGE
+        # 5. LIVE JUDGE (sampled, non-blocking)
         if enable_judge:
-            with st.status("👨‍⚖️ The Judge is reviewing...", expanded=True) as judge_status:
-                evaluation = judge_response(final_query, response)
-                st.info(evaluation)
-                judge_status.update(label="✅ Graded", state="complete", expanded=True)
\ No newline at end of file
+            judge_id = judge.submit(final_query, response, sample_rate=judge_sample_rate)
+            if judge_id:
+                assistant_msg["judge_id"] = judge_id
+                render_verdict(assistant_msg)
@@ -1,6 +1,8 @@
+import argparse
 import os
-import sys
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
 from google import genai
 from rich.console import Console
@@ -8,68 +10,156 @@ from rich.panel import Panel
 from rich.text import Text
 from rich.prompt import Prompt
 from rich.markdown import Markdown
+from rich.table import Table
 
 # Import Agents
 from agents.search_agent import SearchAgent
 from agents.doc_agent import DocAgent
 from agents.code_agent import CodeAgent
-from agents.video_agent import VideoAgent
+from agents.video_agent import VideoAgent, LONG_VIDEO_SECONDS, probe_duration
+from utils import prompt_builder
+from utils.model_policy import default_policy, answer_check
+from utils.cancellation import Cancelled, CancelToken, checkpoint
 
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
 console = Console()
 
+ROUTE_STATUS = {
+    "DOC": "[bold red]📄 Reading...[/bold red]",
+    "VIDEO": "[bold magenta]🎥 Watching...[/bold magenta]",
+    "SEARCH": "[bold blue]🌐 Searching...[/bold blue]",
+    "CODE": "[bold green]💻 Coding...[/bold green]",
+}
+
+ROUTES = ("SEARCH", "DOC", "VIDEO", "CODE", "CHAT")
+# Routes whose answer can be streamed chunk by chunk (execute_route_stream).
+STREAMED_ROUTES = ("SEARCH", "DOC", "CHAT")
+# Recent question/answer pairs used to rewrite follow-up questions.
+CONTEXT_TURNS = 3
+
+def parse_route(text):
+    """Returns the route label from the router's reply, or None if it isn't one."""
+    route = (text or "").strip().upper().replace("\n", "").replace(".", "")
+    return route if route in ROUTES else None
+
+# Local signals used to guess the route before the router answers.
+DOC_HINTS = ("pdf", "document", "summarize", "summary", "chapter", "notes", "according to")
+VIDEO_HINTS = ("video", "watch", "lecture", "clip")
+CODE_HINTS = ("code", "python", "calculate", "plot", "compute", "factorial", "function")
+SEARCH_HINTS = ("who is", "current", "latest", "news", "today", "search")
+
+# Speculative work is charged by estimated prompt tokens: the question plus a
+# system prompt, the document text for DOC, and the video for VIDEO.
+AGENT_OVERHEAD_TOKENS = 500
+VIDEO_TOKENS_PER_SECOND = 300
+
+def no_log(*args):
+    """Log function for agents whose output must not reach the console."""
+
+def model_report_table(stats):
+    """Rich table of ModelPolicy.stats(): per-tier calls, latency, tokens, escalations."""
+    table = Table(title="🧭 Model Tiers")
+    for column in ("Tier", "Model", "Calls", "p50", "p95", "Tokens in/out", "Errors", "Escalations"):
+        table.add_column(column)
+    fmt = lambda v: f"{v:.2f}s" if v is not None else "-"
+    for tier, s in stats.items():
+        table.add_row(tier, s["model"], str(s["calls"]), fmt(s["p50_seconds"]), fmt(s["p95_seconds"]),
+                      f"{s['prompt_tokens']}/{s['output_tokens']}", str(s["errors"]), str(s["escalations"]))
+    return table
+
 class StudyManager:
-    def __init__(self):
+    def __init__(self, speculative=False, max_speculative=1, speculation_budget=200_000, client=None, policy=None):
         console.print(Panel.fit("[bold cyan]🐝 Study Swarm Agent 2.0[/bold cyan]", border_style="cyan"))
         
-        self.client = genai.Client(api_key=API_KEY)
-        self.model_name = "gemini-2.0-flash"
+        self.client = client or genai.Client(api_key=API_KEY)
+        self.policy = policy or default_policy
         
         with console.status("[bold yellow]Waking up agents...[/bold yellow]", spinner="dots"):
-            self.search_agent = SearchAgent()
-            self.doc_agent = DocAgent()
-            self.code_agent = CodeAgent()
-            self.video_agent = VideoAgent()
+            self.search_agent = SearchAgent(client=client, policy=self.policy)
+            self.doc_agent = DocAgent(client=client, policy=self.policy)
+            self.code_agent = CodeAgent(client=client, policy=self.policy)
+            self.video_agent = VideoAgent(client=client, policy=self.policy)
+            # Silent twins for speculative runs, sharing caches and pre-processing.
+            self._quiet_agents = {
+                "SEARCH": SearchAgent(client=client, policy=self.policy, log=no_log),
+                "DOC": self.doc_agent,  # Prints nothing
+                "CODE": CodeAgent(client=client, policy=self.policy, log=no_log),
+                "VIDEO": VideoAgent(client=client, policy=self.policy, log=no_log),
+            }
             time.sleep(1) 
         
         console.print("[bold green]✅ System Online.[/bold green]")
         
         self.current_pdf = None
         self.current_video = None
+        self._video_seconds = None
+        self._preprocessing_reported = False
+
+        self.speculative = speculative
+        self.max_speculative = max_speculative
+        self.speculation_budget = speculation_budget
+        self.speculation_stats = {"queries": 0, "speculated": 0, "hits": 0,
+                                  "cancelled": 0, "wasted_tokens": 0, "saved_seconds": 0.0}
+        # Router calls only; speculative agents run on daemon threads (see _start_speculative).
+        self._pool = ThreadPoolExecutor(max_workers=2)
 
-    def route_query(self, query: str) -> str:
+    def route_query(self, query: str, pdf_path=None, video_path=None, strict=False) -> str:
         """
         Decides which agent to use. Includes Retry Logic for 429 Errors.
+        Runs on the light tier and escalates if the reply isn't a valid route.
+        pdf_path/video_path override the loaded files (used by per-user server sessions).
+        Falls back to CHAT if routing fails, or raises instead when strict=True.
         """
-        prompt = f"""
-        You are the Manager of a Study Swarm.
-        1. SEARCH: Real-time news, facts, definitions.
-        2. DOC: Questions about the uploaded PDF ({self.current_pdf}).
-        3. VIDEO: Questions about the uploaded Video ({self.current_video}).
-        4. CODE: Math, logic, python code.
-        5. CHAT: General greetings/conversation.
-
-        User Query: "{query}"
-        
-        Return ONLY one word: SEARCH, DOC, VIDEO, CODE, or CHAT.
-        """
+        pdf_path = pdf_path or self.current_pdf
+        video_path = video_path or self.current_video
+        prompt = prompt_builder.ROUTER.build(pdf=pdf_path, video=video_path, question=query)
         
         # Retry Loop for robustness
+        error = None
         for attempt in range(3):
             try:
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt
+                response = self.policy.generate_with_escalation(
+                    self.client, "route", prompt,
+                    check=lambda text: parse_route(text) is not None
                 )
-                return response.text.strip().upper().replace("\n", "").replace(".", "")
+                route = parse_route(response.text)
+                if route:
+                    return route
+                error = ValueError(f"Router returned no valid route: {response.text!r}")
+                break
             except Exception as e:
+                error = e
                 if "429" in str(e):
                     time.sleep(2) # Wait a bit if overloaded
                     continue
-                return "CHAT" # Fallback
-        return "CHAT"
+                break
+        if strict:
+            raise error
+        return "CHAT" # Fallback
+
+    def contextualize(self, query: str, history) -> str:
+        """
+        Rewrites a follow-up into a standalone question using the last few
+        {'query', 'answer'} turns (light tier). Returns the query unchanged
+        when there is no history or the rewrite fails.
+        """
+        if not history:
+            return query
+        messages = []
+        for turn in history[-CONTEXT_TURNS:]:
+            messages += [{"role": "user", "content": turn["query"]},
+                         {"role": "assistant", "content": turn["answer"]}]
+        prompt = prompt_builder.REWRITE.build(history=prompt_builder.format_history(messages), question=query)
+        try:
+            response = self.policy.generate_with_escalation(
+                self.client, "rewrite", prompt,
+                check=lambda text: bool(text and text.strip()) and len(text) < 4 * len(query) + 200
+            )
+            return response.text.strip().strip('"') or query
+        except Exception:
+            return query
 
     def run(self):
         console.print("\n[bold white]🎓 Study Swarm is ready![/bold white]")
@@ -79,12 +169,14 @@ class StudyManager:
         pdf_input = Prompt.ask("\n[bold yellow]📂 PDF Path[/bold yellow] (Enter to skip)")
         if pdf_input and os.path.exists(pdf_input):
             self.current_pdf = pdf_input
-            console.print(f"[green]✅ Loaded PDF:[/green] {self.current_pdf}")
+            self.doc_agent.preload(self.current_pdf)
+            console.print(f"[green]✅ Loaded PDF:[/green] {self.current_pdf} [dim](pre-processing in the background)[/dim]")
 
         # 2. Ask for Video
         video_input = Prompt.ask("[bold magenta]🎥 Video Path[/bold magenta] (Enter to skip)")
         if video_input and os.path.exists(video_input):
             self.current_video = video_input
+            self._video_seconds = probe_duration(video_input)
             console.print(f"[green]✅ Loaded Video:[/green] {self.current_video}")
 
         console.print("\n[dim]Type 'quit' to exit.[/dim]")
@@ -93,53 +185,250 @@ class StudyManager:
             user_input = Prompt.ask("\n[bold cyan]User[/bold cyan]")
             
             if user_input.lower() in ['quit', 'exit']:
+                self.print_model_report()
+                if self.speculative:
+                    self.print_speculation_report()
                 console.print("[bold violet]👋 Goodbye.[/bold violet]")
+                self._pool.shutdown(wait=False, cancel_futures=True)
                 break
             
             if not user_input: continue
+
+            self.report_preprocessing()
                 
-            # ROUTING
-            with console.status("[bold yellow]🤔 Routing...[/bold yellow]"):
-                route = self.route_query(user_input)
-            
-            console.print(f"   [dim]↳ Routing to:[/dim] [bold magenta]{route}[/bold magenta]")
-            
-            response = ""
-            try:
-                if route == "DOC":
-                    if self.current_pdf:
-                        with console.status("[bold red]📄 Reading...[/bold red]"):
-                            response = self.doc_agent.ask_pdf(self.current_pdf, user_input)
-                    else:
-                        response = "No PDF loaded."
-
-                elif route == "VIDEO":
-                    if self.current_video:
-                        # Video agent handles its own status spinner
-                        response = self.video_agent.analyze_video(self.current_video, user_input)
-                    else:
-                        response = "No Video loaded."
-                        
-                elif route == "SEARCH":
-                    with console.status("[bold blue]🌐 Searching...[/bold blue]"):
-                        response = self.search_agent.research(user_input)
-                    
-                elif route == "CODE":
-                    response = self.code_agent.solve(user_input)
-                    
-                else:
-                    # General Chat
-                    response = self.client.models.generate_content(
-                        model=self.model_name,
-                        contents=f"Reply briefly: {user_input}"
-                    ).text
-                    
-            except Exception as e:
-                response = f"⚠️ Error: {e}"
+            if self.speculative:
+                route, response = self.speculate(user_input)
+            else:
+                # ROUTING
+                with console.status("[bold yellow]🤔 Routing...[/bold yellow]"):
+                    route = self.route_query(user_input)
+
+                console.print(f"   [dim]↳ Routing to:[/dim] [bold magenta]{route}[/bold magenta]")
+
+                with console.status(ROUTE_STATUS.get(route, "[bold yellow]🤔 Thinking...[/bold yellow]")):
+                    response = self.execute_route(route, user_input)
 
             if route != "CODE":
                 console.print(Panel(Markdown(response), title="🐝 Swarm Answer", border_style="green"))
 
+    def execute_route(self, route: str, user_input: str, pdf_path=None, video_path=None,
+                      quiet=False, cancel=None):
+        """
+        Runs the agent for a route and returns its response.
+        quiet=True uses agents that print nothing; a CancelToken stops the
+        agent (raising Cancelled) before its model call once cancelled.
+        """
+        pdf_path = pdf_path or self.current_pdf
+        video_path = video_path or self.current_video
+        agents = self._quiet_agents if quiet else {
+            "SEARCH": self.search_agent, "DOC": self.doc_agent,
+            "CODE": self.code_agent, "VIDEO": self.video_agent,
+        }
+        try:
+            if route == "DOC":
+                if pdf_path:
+                    return agents["DOC"].ask_pdf(pdf_path, user_input, cancel=cancel)
+                return "No PDF loaded."
+
+            elif route == "VIDEO":
+                if video_path:
+                    return agents["VIDEO"].analyze_video(video_path, user_input, cancel=cancel)
+                return "No Video loaded."
+
+            elif route == "SEARCH":
+                return agents["SEARCH"].research(user_input, cancel=cancel)
+
+            elif route == "CODE":
+                return agents["CODE"].solve(user_input, cancel=cancel)
+
+            else:
+                # General Chat
+                prompt = prompt_builder.BRIEF_CHAT.build(question=user_input)
+                checkpoint(cancel)
+                return self.policy.generate_with_escalation(self.client, "chat", prompt, check=answer_check).text
+
+        except Cancelled:
+            raise
+        except Exception as e:
+            return f"⚠️ Error: {e}"
+
+    def execute_route_stream(self, route: str, user_input: str, pdf_path=None, video_path=None):
+        """
+        Like execute_route for STREAMED_ROUTES, but yields the answer's text in
+        chunks as the model produces it.
+        """
+        if route not in STREAMED_ROUTES:
+            raise ValueError(f"Route {route} can't be streamed.")
+        pdf_path = pdf_path or self.current_pdf
+        try:
+            if route == "DOC":
+                if pdf_path:
+                    yield from self.doc_agent.ask_pdf_stream(pdf_path, user_input)
+                else:
+                    yield "No PDF loaded."
+
+            elif route == "SEARCH":
+                yield from self.search_agent.research_stream(user_input)
+
+            else:
+                yield from self.policy.generate_stream(
+                    self.client, "chat",
+                    prompt_builder.BRIEF_CHAT.build(question=user_input)
+                )
+
+        except Exception as e:
+            yield f"⚠️ Error: {e}"
+
+    def guess_routes(self, query: str) -> list:
+        """
+        Cheap local guesses at the route (no model call), most likely first.
+        """
+        lower = query.lower()
+        guesses = []
+        if self.current_pdf and any(hint in lower for hint in DOC_HINTS):
+            guesses.append("DOC")
+        if self.current_video and any(hint in lower for hint in VIDEO_HINTS):
+            guesses.append("VIDEO")
+        if any(hint in lower for hint in CODE_HINTS):
+            guesses.append("CODE")
+        if any(hint in lower for hint in SEARCH_HINTS):
+            guesses.append("SEARCH")
+        return guesses
+
+    def speculate(self, user_input: str):
+        """
+        Starts the likeliest agent(s) while the router runs. If the router
+        agrees, the speculative result is committed; otherwise the extra work
+        is cancelled (it stops before its model call if it hasn't reached it)
+        and discarded, and the routed agent runs as usual.
+        Returns (route, response).
+        """
+        stats = self.speculation_stats
+        guesses = {}
+        for guess in self.guess_routes(user_input)[:self.max_speculative]:
+            # Long videos fan out to their own (non-daemon) segment pool,
+            # which would hold up exit if the work were discarded.
+            if guess == "VIDEO" and (self._video_seconds or 0) > LONG_VIDEO_SECONDS:
+                continue
+            cost = self.speculation_cost(guess, user_input)
+            if stats["wasted_tokens"] + cost <= self.speculation_budget:
+                guesses[guess] = cost
+
+        start = time.perf_counter()
+        route_future = self._pool.submit(self._timed, self.route_query, user_input)
+        speculative = {guess: self._start_speculative(guess, user_input) for guess in guesses}
+        if guesses:
+            console.print(f"   [dim]↳ Speculating:[/dim] [bold cyan]{', '.join(guesses)}[/bold cyan]")
+
+        with console.status("[bold yellow]🤔 Routing...[/bold yellow]"):
+            route, route_seconds = route_future.result()
+        console.print(f"   [dim]↳ Routing to:[/dim] [bold magenta]{route}[/bold magenta]")
+
+        # Wrong guesses are cancelled before the routed agent runs, so any
+        # still on local work never reach the model.
+        for guess, (_, cancel) in speculative.items():
+            if guess == route:
+                continue
+            if cancel.cancel():
+                stats["wasted_tokens"] += guesses[guess]  # Its model call already went out
+            else:
+                stats["cancelled"] += 1
+
+        with console.status(ROUTE_STATUS.get(route, "[bold yellow]🤔 Thinking...[/bold yellow]")):
+            if route in speculative:
+                response, agent_seconds = speculative[route][0].result()
+                stats["hits"] += 1
+            else:
+                response, agent_seconds = self._timed(self.execute_route, route, user_input)
+
+        elapsed = time.perf_counter() - start
+        stats["queries"] += 1
+        if guesses:
+            stats["speculated"] += 1
+        # Sequential baseline = routing, then the agent.
+        stats["saved_seconds"] += (route_seconds + agent_seconds) - elapsed
+        return route, response
+
+    def report_preprocessing(self):
+        """Prints the loaded PDF's pre-processing result once it has finished."""
+        if not self.current_pdf or self._preprocessing_reported:
+            return
+        status = self.doc_agent.preprocessing_status(self.current_pdf)
+        if not status or not status["done"]:
+            return
+        self._preprocessing_reported = True
+        if status["error"]:
+            console.print(f"   [dim]↳ PDF pre-processing failed ({status['error']}); answering from the file.[/dim]")
+        else:
+            console.print(f"   [dim]↳ PDF pre-processed: {status['sections']} sections summarized.[/dim]")
+
+    def speculation_cost(self, route, user_input):
+        """Estimated prompt tokens a speculative run of `route` sends to the model."""
+        tokens = prompt_builder.estimate_tokens(user_input) + AGENT_OVERHEAD_TOKENS
+        if route == "DOC":
+            budget = self.policy.prompt_budget("doc")
+            text = self.doc_agent.preprocessor.document_text(self.current_pdf)
+            # Not extracted yet: assume the document fills the prompt.
+            tokens += budget if text is None else min(prompt_builder.estimate_tokens(text), budget)
+        elif route == "VIDEO":
+            tokens += int((self._video_seconds or LONG_VIDEO_SECONDS) * VIDEO_TOKENS_PER_SECOND)
+        return tokens
+
+    def _start_speculative(self, route, user_input):
+        """
+        Runs execute_route with the quiet agents on a daemon thread, so
+        discarded work neither prints mid-spinner nor delays exit.
+        Returns (Future of (response, seconds), CancelToken).
+        """
+        cancel = CancelToken()
+        future = Future()
+        future.set_running_or_notify_cancel()
+
+        def run():
+            try:
+                future.set_result(self._timed(self.execute_route, route, user_input, None, None, True, cancel))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True, name=f"speculate-{route}").start()
+        return future, cancel
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - start
+
+    def print_model_report(self):
+        stats = self.policy.stats()
+        if stats:
+            console.print(model_report_table(stats))
+
+    def print_speculation_report(self):
+        stats = self.speculation_stats
+        if not stats["queries"]:
+            return
+        hit_rate = stats["hits"] / stats["speculated"] if stats["speculated"] else 0.0
+        console.print(Panel.fit(
+            f"Queries: {stats['queries']}  |  Speculated: {stats['speculated']}  |  "
+            f"Hit rate: {hit_rate:.0%}\n"
+            f"Latency saved vs sequential: {stats['saved_seconds']:.1f}s "
+            f"({stats['saved_seconds'] / stats['queries']:.2f}s/query)  |  "
+            f"Cancelled before the model: {stats['cancelled']}  |  "
+            f"Wasted tokens: {stats['wasted_tokens']:,}/{self.speculation_budget:,}",
+            title="⚡ Speculation Report", border_style="cyan"
+        ))
+
 if __name__ == "__main__":
-    manager = StudyManager()
+    parser = argparse.ArgumentParser(description="Study Swarm CLI")
+    parser.add_argument("--speculative", action="store_true",
+                        help="Start the likeliest agent while routing runs.")
+    parser.add_argument("--max-speculative", type=int, default=1,
+                        help="Max agents started speculatively per query.")
+    parser.add_argument("--speculation-budget", type=int, default=200_000,
+                        help="Max estimated prompt tokens of discarded speculative work per session.")
+    args = parser.parse_args()
+
+    manager = StudyManager(speculative=args.speculative,
+                           max_speculative=args.max_speculative,
+                           speculation_budget=args.speculation_budget)
     manager.run()
\ No newline at end of file
@@ -1,6 +1,8 @@
+import argparse
 import os
 import time
 import json
+import statistics
 from dotenv import load_dotenv
 from google import genai
 from rich.console import Console
@@ -9,23 +11,33 @@ from rich.panel import Panel
 from rich.progress import track
 
 # Import Agents
-from agents.search_agent import SearchAgent
-from agents.code_agent import CodeAgent
-from agents.doc_agent import DocAgent
+from utils import prompt_builder
+from utils.model_policy import ModelPolicy, default_policy
+from cli_main import StudyManager, model_report_table
 
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 console = Console()
 
+def parse_score(evaluation):
+    score_line = [line for line in evaluation.split('\n') if "SCORE:" in line][0]
+    return int(score_line.split(":")[1].strip())
+
+def flat_policy():
+    """Baseline: routing and every agent on the standard model, no escalation."""
+    tasks = {task: "standard" for task in default_policy.tasks}
+    return ModelPolicy(tasks=tasks, escalation={})
+
 class AIJudge:
-    def __init__(self):
+    def __init__(self, policy=None, judge_policy=None):
         self.client = genai.Client(api_key=API_KEY)
-        self.model_name = "gemini-2.0-flash"
+        self.policy = policy or default_policy
+        # Grading runs on its own policy so compared runs are judged identically
+        # and the judge's calls don't show up in the agents' model report.
+        self.judge_policy = judge_policy or self.policy
         
-        # Initialize Agents to be tested
-        self.search_agent = SearchAgent()
-        self.code_agent = CodeAgent()
-        self.doc_agent = DocAgent()
+        # Router and agents under test, as a live request would use them
+        self.manager = StudyManager(client=self.client, policy=self.policy)
 
     def create_test_pdf(self):
         """Creates a dummy PDF for the Doc Agent test."""
@@ -48,33 +60,39 @@ class AIJudge:
 
     def get_judge_score(self, query, response, criteria):
         """Asks Gemini to grade the response."""
-        judge_prompt = f"""
-        You are an AI Quality Assurance Judge. 
-        
-        USER QUERY: "{query}"
-        AGENT RESPONSE: "{response}"
-        
-        CRITERIA: {criteria}
-        
-        INSTRUCTIONS:
-        1. Rate the response on a scale of 1 to 5.
-        2. 1 = Terrible/Wrong, 5 = Perfect.
-        3. Provide a brief 1-sentence explanation.
-        
-        FORMAT:
-        SCORE: [number]
-        REASON: [explanation]
-        """
+        judge_prompt = prompt_builder.EVAL_JUDGE.build(
+            question=query, response=response, criteria=criteria
+        )
         
         try:
-            eval_resp = self.client.models.generate_content(
-                model=self.model_name,
-                contents=judge_prompt
+            # Light tier; escalate if the verdict has no parseable score.
+            def has_score(text):
+                try:
+                    parse_score(text)
+                    return True
+                except (IndexError, ValueError):
+                    return False
+
+            eval_resp = self.judge_policy.generate_with_escalation(
+                self.client, "judge", judge_prompt, check=has_score
             ).text
             return eval_resp
         except:
             return "SCORE: 0\nREASON: Evaluation Failed."
 
+    def route(self, test):
+        """Routes the query like a live request (light tier in the cascade)."""
+        return self.manager.route_query(test["query"], pdf_path=test.get("pdf"))
+
+    def run_agent(self, route, test):
+        """
+        Answers like a live request, including the agents' own escalation
+        (empty or refusing answers are retried one tier up).
+        """
+        response = self.manager.execute_route(route, test["query"], pdf_path=test.get("pdf"))
+        # Handle the dict response from code agent
+        return response["text"] if isinstance(response, dict) else str(response)
+
     def run_evals(self):
         console.print(Panel.fit("[bold magenta]🤖 AI Evaluation Pipeline[/bold magenta]", border_style="magenta"))
         
@@ -85,19 +103,16 @@ class AIJudge:
             {
                 "type": "SEARCH",
                 "query": "Who is the current CEO of Google?",
-                "agent": self.search_agent,
                 "criteria": "Must be accurate (Sundar Pichai) and recent."
             },
             {
                 "type": "CODE",
                 "query": "Calculate the factorial of 5 using Python.",
-                "agent": self.code_agent,
                 "criteria": "Must include Python code AND the correct execution result (120)."
             },
             {
                 "type": "DOC",
                 "query": "What is the budget for Project Apollo 2.0?",
-                "agent": self.doc_agent,
                 "pdf": pdf_path, 
                 "criteria": "Must extract '$500 Million' from the provided PDF text."
             }
@@ -108,43 +123,49 @@ class AIJudge:
         # 2. Run Tests
         for test in track(test_cases, description="Running Tests..."):
             try:
-                # A. Get Agent Response
-                if test["type"] == "SEARCH":
-                    response = test["agent"].research(test["query"])
-                elif test["type"] == "CODE":
-                    # Handle the dict response from code agent
-                    res_pkg = test["agent"].solve(test["query"])
-                    response = res_pkg["text"] 
-                elif test["type"] == "DOC":
-                    response = test["agent"].ask_pdf(test["pdf"], test["query"])
+                # A. Route and get the Agent Response (latency covers both)
+                start = time.perf_counter()
+                route = self.route(test)
+                # Starting tier; escalations show in the model report below.
+                tier = self.policy.tier_for(route.lower())
+                response = self.run_agent(route, test)
+                latency = time.perf_counter() - start
                 
                 # B. Judge Response
                 evaluation = self.get_judge_score(test["query"], response, test["criteria"])
                 
                 # C. Parse Score
-                score_line = [line for line in evaluation.split('\n') if "SCORE:" in line][0]
-                score = int(score_line.split(":")[1].strip())
+                score = parse_score(evaluation)
                 
                 results.append({
                     "Type": test["type"],
+                    "Route": route,
                     "Query": test["query"],
                     "Score": score,
-                    "Evaluation": evaluation
+                    "Evaluation": evaluation,
+                    "Latency": latency,
+                    "Tier": tier
                 })
                 
             except Exception as e:
                 results.append({
                     "Type": test["type"],
+                    "Route": "-",
                     "Query": test["query"],
                     "Score": 0,
-                    "Evaluation": f"Error: {str(e)}"
+                    "Evaluation": f"Error: {str(e)}",
+                    "Latency": None,
+                    "Tier": "-"
                 })
 
         # 3. Print Report
         table = Table(title="📊 Evaluation Report")
         table.add_column("Agent", style="cyan")
+        table.add_column("Route", style="cyan")
         table.add_column("Query", style="white")
         table.add_column("Score", style="bold green")
+        table.add_column("Tier", style="magenta")
+        table.add_column("Latency", style="white")
         table.add_column("Judge's Reason", style="yellow")
 
         total_score = 0
@@ -155,18 +176,49 @@ class AIJudge:
             # Color code the score
             score_display = f"[green]{res['Score']}/5[/green]" if res['Score'] >= 4 else f"[red]{res['Score']}/5[/red]"
             
-            table.add_row(res["Type"], res["Query"], score_display, reason_text)
+            latency_display = f"{res['Latency']:.1f}s" if res["Latency"] is not None else "-"
+            table.add_row(res["Type"], res["Route"], res["Query"], score_display, res["Tier"], latency_display, reason_text)
             total_score += res["Score"]
 
         console.print(table)
         
         avg = total_score / len(test_cases)
         console.print(f"\n[bold white]📈 Average System Reliability:[/bold white] [bold blue]{avg:.1f}/5.0[/bold blue]")
+
+        latencies = [res["Latency"] for res in results if res["Latency"] is not None]
+        median_latency = statistics.median(latencies) if latencies else None
+        if median_latency is not None:
+            console.print(f"[bold white]⏱️ Median Agent Latency:[/bold white] [bold blue]{median_latency:.1f}s[/bold blue]")
+        console.print(model_report_table(self.policy.stats()))
         
         # Cleanup
         if os.path.exists(pdf_path):
             os.remove(pdf_path)
 
+        return {"avg_score": avg, "median_latency": median_latency}
+
 if __name__ == "__main__":
-    judge = AIJudge()
-    judge.run_evals()
+    parser = argparse.ArgumentParser(description="AI Evaluation Pipeline")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also run a flat all-standard-model baseline and compare it to the cascade.")
+    args = parser.parse_args()
+
+    if args.compare:
+        # One judge for both runs so scores are comparable.
+        judge_policy = ModelPolicy()
+        console.print("[bold]Baseline: standard model everywhere[/bold]")
+        baseline = AIJudge(policy=flat_policy(), judge_policy=judge_policy).run_evals()
+        console.print("[bold]Cascade: tiered models with escalation[/bold]")
+        cascade = AIJudge(policy=ModelPolicy(), judge_policy=judge_policy).run_evals()
+
+        table = Table(title="⚖️ Baseline vs Cascade")
+        table.add_column("Policy", style="cyan")
+        table.add_column("Avg Score", style="bold green")
+        table.add_column("Median Latency", style="yellow")
+        for name, summary in (("Baseline", baseline), ("Cascade", cascade)):
+            latency = f"{summary['median_latency']:.1f}s" if summary["median_latency"] is not None else "-"
+            table.add_row(name, f"{summary['avg_score']:.1f}/5.0", latency)
+        console.print(table)
+    else:
+        judge = AIJudge()
+        judge.run_evals()
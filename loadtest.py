@@ -0,0 +1,304 @@
+"""
+Concurrent session load test for the Study Swarm.
+
+Simulates N students running scripted sessions (load a PDF, ask about it, run
+code, search) through one shared StudyManager, the way server.py serves them,
+against the local MockClient. Load is stepped through several user counts to
+find where throughput stops scaling.
+
+Each user fills the script's questions from topic pools with their own random
+stream, so users mostly ask different things. --no-coalesce also turns off
+request coalescing and precomputed PDF answers, so every request reaches the
+model (the worst case).
+
+Usage:
+    python loadtest.py --users 1,5,10,25,50 --duration 20 --latency 0.8 --error-rate 0.02
+    python loadtest.py --users 10,50 --max-concurrency 20 --no-coalesce --out run_b.json
+
+Results (per-stage throughput, latency percentiles, error rate, memory and a
+time series in 5-second windows) are written as JSON so runs can be diffed.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from cli_main import StudyManager
+from agents.doc_agent import _doc_flight
+from agents.search_agent import _search_flight
+from utils.mock_client import MockClient
+
+# Bound to the real stdout so the report survives the redirect below.
+console = Console(file=sys.stdout)
+
+WINDOW_SECONDS = 5
+
+# Each step is (action, text). "load_pdf" attaches the test PDF to the session.
+# {placeholders} are filled from QUERY_POOLS each time the step runs.
+SESSION_SCRIPTS = [
+    [
+        ("load_pdf", None),
+        ("ask", "Summarize this PDF"),
+        ("ask", "What does the document say about the {pdf_topic}?"),
+        ("ask", "Calculate {calculation} using python"),
+    ],
+    [
+        ("ask", "Who is the current {role}?"),
+        ("ask", "Search the latest news on {field}"),
+        ("ask", "Write python code to plot {curve}"),
+    ],
+    [
+        ("load_pdf", None),
+        ("ask", "What is the {pdf_topic} in the document?"),
+        ("ask", "Hello!"),
+        ("ask", "Calculate the factorial of {n} in python"),
+        ("ask", "Who is the current {role}?"),
+    ],
+]
+
+QUERY_POOLS = {
+    "pdf_topic": ["launch date", "codename", "project goals", "budget", "main risks",
+                  "timeline", "team members", "next steps", "open questions", "success criteria"],
+    "calculation": ["how many days until Jan 2026", "the compound interest on $1000 at 5% for 10 years",
+                    "the mean of 3, 7, 11 and 19", "the 20th Fibonacci number",
+                    "how many seconds are in a leap year", "the square root of 2 to 10 places",
+                    "the area of a circle with radius 7", "15% of 2480"],
+    "role": ["CEO of Google", "president of Kenya", "prime minister of Japan", "UN Secretary-General",
+             "CEO of Microsoft", "president of France", "chancellor of Germany", "director of NASA"],
+    "field": ["quantum computing", "fusion energy", "Mars exploration", "battery technology",
+              "gene editing", "climate policy", "semiconductors", "AI regulation"],
+    "curve": ["a sine wave", "a cosine wave", "a parabola", "an exponential curve",
+              "a logistic curve", "a spiral", "a normal distribution", "a damped oscillation"],
+    "n": [str(n) for n in range(8, 24)],
+}
+
+def fill_query(template, rng):
+    return template.format(**{key: rng.choice(pool) for key, pool in QUERY_POOLS.items()})
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def current_rss_mb():
+    """Resident memory now (Linux), falling back to the peak on other systems."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1_000_000
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1_000_000 if sys.platform == "darwin" else peak / 1_000
+
+def is_error(response):
+    # Agents report failures as text rather than raising.
+    text = response.get("text", "") if isinstance(response, dict) else str(response)
+    return text.startswith(("Error", "⚠️"))
+
+def make_test_pdf(path):
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 50), "Secret Project: The codename is 'Blue Sky'. The launch date is Jan 2026.")
+    doc.save(path)
+    return path
+
+class LoadTest:
+    def __init__(self, manager, pdf_path, think_time=1.0, seed=0):
+        self.manager = manager
+        self.pdf_path = pdf_path
+        self.think_time = think_time
+        self.seed = seed
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def _user(self, user_index, stop_at, stage_start):
+        rng = random.Random(self.seed * 1000 + user_index)
+        script = SESSION_SCRIPTS[user_index % len(SESSION_SCRIPTS)]
+        pdf_path = None
+        while time.perf_counter() < stop_at:
+            for action, text in script:
+                if time.perf_counter() >= stop_at:
+                    return
+                if action == "load_pdf":
+                    pdf_path = self.pdf_path
+                    self.manager.doc_agent.preload(pdf_path)
+                    continue
+
+                text = fill_query(text, rng)
+                start = time.perf_counter()
+                try:
+                    # strict: a router failure is an error, not a silent CHAT fallback.
+                    route = self.manager.route_query(text, pdf_path=pdf_path, strict=True)
+                    response = self.manager.execute_route(route, text, pdf_path=pdf_path)
+                    error = is_error(response)
+                except Exception:
+                    route, error = "EXCEPTION", True
+                end = time.perf_counter()
+
+                with self._lock:
+                    self.samples.append({
+                        "t": round(end - stage_start, 3),
+                        "latency": round(end - start, 4),
+                        "route": route,
+                        "error": error
+                    })
+                # Exponential think time, like real students pausing to read.
+                time.sleep(rng.expovariate(1 / self.think_time) if self.think_time else 0)
+
+    def run_stage(self, users, duration):
+        self.samples = []
+        rss_before = current_rss_mb()
+        stage_start = time.perf_counter()
+        stop_at = stage_start + duration
+        threads = [
+            threading.Thread(target=self._user, args=(i, stop_at, stage_start), daemon=True)
+            for i in range(users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - stage_start
+        return self._summarize(users, elapsed, rss_before, current_rss_mb())
+
+    def _summarize(self, users, elapsed, rss_before, rss_after):
+        latencies = [s["latency"] for s in self.samples]
+        errors = sum(s["error"] for s in self.samples)
+        timeline = []
+        for window_start in range(0, int(elapsed) + 1, WINDOW_SECONDS):
+            window = [s for s in self.samples if window_start <= s["t"] < window_start + WINDOW_SECONDS]
+            if not window:
+                continue
+            window_latencies = [s["latency"] for s in window]
+            timeline.append({
+                "window_start": window_start,
+                "requests": len(window),
+                "p50": percentile(window_latencies, 50),
+                "p95": percentile(window_latencies, 95),
+                "errors": sum(s["error"] for s in window)
+            })
+        routes = {}
+        for s in self.samples:
+            routes[s["route"]] = routes.get(s["route"], 0) + 1
+
+        return {
+            "users": users,
+            "duration_seconds": round(elapsed, 2),
+            "requests": len(self.samples),
+            "throughput_rps": round(len(self.samples) / elapsed, 3) if elapsed else 0.0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "error_rate": round(errors / len(self.samples), 4) if self.samples else 0.0,
+            "rss_mb_before": round(rss_before, 1),
+            "rss_mb_after": round(rss_after, 1),
+            "rss_growth_mb": round(rss_after - rss_before, 1),
+            "routes": routes,
+            "timeline": timeline
+        }
+
+def find_saturation(stages, min_gain=0.10, p95_factor=2.0, max_error_rate=0.05):
+    """
+    First stage where adding users stops paying off: throughput grows less than
+    min_gain, p95 exceeds p95_factor x the first stage, or errors pass max_error_rate.
+    """
+    if not stages:
+        return None
+    base_p95 = stages[0]["p95"] or 0
+    for previous, stage in zip([None] + stages, stages):
+        reasons = []
+        # Growth and p95 are relative, so they start at the second stage;
+        # the error rate is checked on every stage, the first one included.
+        if previous and previous["throughput_rps"] and stage["throughput_rps"] < previous["throughput_rps"] * (1 + min_gain):
+            reasons.append("throughput plateaued")
+        if previous and base_p95 and stage["p95"] and stage["p95"] > base_p95 * p95_factor:
+            reasons.append(f"p95 > {p95_factor:g}x baseline")
+        if stage["error_rate"] > max_error_rate:
+            reasons.append(f"error rate > {max_error_rate:.0%}")
+        if reasons:
+            return {"users": stage["users"], "reasons": reasons}
+    return None
+
+def print_report(stages, saturation):
+    table = Table(title="📈 Load Test Report")
+    for column in ("Users", "Req", "RPS", "p50", "p95", "p99", "Errors", "RSS Δ"):
+        table.add_column(column, justify="right")
+    for s in stages:
+        fmt = lambda v: f"{v:.2f}s" if v is not None else "-"
+        table.add_row(str(s["users"]), str(s["requests"]), f"{s['throughput_rps']:.2f}",
+                      fmt(s["p50"]), fmt(s["p95"]), fmt(s["p99"]),
+                      f"{s['error_rate']:.1%}", f"{s['rss_growth_mb']:+.1f} MB")
+    console.print(table)
+    if saturation:
+        console.print(f"[bold red]Saturation at {saturation['users']} users:[/bold red] {', '.join(saturation['reasons'])}")
+    else:
+        console.print("[bold green]No saturation within the tested range.[/bold green]")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1,5,10,25,50", help="Comma-separated user counts, one stage each.")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per stage.")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean seconds between a user's requests.")
+    parser.add_argument("--latency", type=float, default=0.8, help="Mock model latency (seconds).")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Mock latency jitter (fraction).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock random 429 rate (0-1).")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Mock quota on concurrent calls.")
+    parser.add_argument("--no-coalesce", action="store_true",
+                        help="Disable request coalescing and precomputed PDF answers.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="loadtest_results.json")
+    args = parser.parse_args()
+
+    user_counts = [int(u) for u in args.users.split(",") if u.strip()]
+    client = MockClient(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        max_concurrency=args.max_concurrency, seed=args.seed)
+    manager = StudyManager(client=client)
+    if args.no_coalesce:
+        for flight in (_search_flight, _doc_flight):
+            flight.enabled = False
+        manager.doc_agent.preprocessor.quick_answers = False
+    pdf_path = make_test_pdf("loadtest_notes.pdf")
+    test = LoadTest(manager, pdf_path, think_time=args.think_time, seed=args.seed)
+
+    stages = []
+    try:
+        for users in user_counts:
+            with console.status(f"[bold yellow]Running {users} users for {args.duration:.0f}s...[/bold yellow]"):
+                # Agents print per request; keep the console readable.
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    stage = test.run_stage(users, args.duration)
+            stages.append(stage)
+            console.print(f"   {users} users: {stage['throughput_rps']:.2f} req/s, "
+                          f"p95 {stage['p95'] or 0:.2f}s, errors {stage['error_rate']:.1%}")
+    finally:
+        os.remove(pdf_path)
+
+    saturation = find_saturation(stages)
+    print_report(stages, saturation)
+
+    results = {
+        "config": vars(args),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mock_calls": client.calls,
+        "coalesced_calls": _search_flight.coalesced + _doc_flight.coalesced,
+        "model_tiers": manager.policy.stats(),
+        "stages": stages,
+        "saturation": saturation
+    }
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    console.print(f"[dim]Results written to {args.out}[/dim]")
+
+if __name__ == "__main__":
+    main()
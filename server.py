@@ -0,0 +1,415 @@
+"""
+Multi-user HTTP API for the Study Swarm.
+
+Requests go into a bounded job queue drained by a fixed pool of workers, each
+running the (blocking) router and agents in a thread. When the queue is full
+the API answers 429 instead of piling up work. Every response carries queue
+depth headers so clients and load balancers can back off early.
+
+Usage:
+    python server.py --workers 8 --queue-size 64
+    python server.py --mock --mock-latency 0.5   # Local mock backend, no API key
+
+Endpoints:
+    POST   /ask                      {"user_id", "query", "progress"}
+    POST   /sessions/{user_id}/pdf?filename=...   raw file body
+    POST   /sessions/{user_id}/video?filename=... raw file body
+    GET    /sessions/{user_id}
+    DELETE /sessions/{user_id}
+    GET    /health
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from cli_main import StudyManager, STREAMED_ROUTES
+
+UPLOAD_DIR = "uploads"
+SESSION_TTL_SECONDS = 60 * 60
+HISTORY_LENGTH = 10
+MAX_PDF_BYTES = 100 * 1024 * 1024
+MAX_VIDEO_BYTES = 2 * 1024 * 1024 * 1024
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def check_user_id(user_id):
+    # user_id becomes a directory name under UPLOAD_DIR.
+    if not USER_ID_PATTERN.match(user_id):
+        raise HTTPException(status_code=400, detail="user_id must be 1-64 letters, digits, '_' or '-'.")
+
+def display_name(filename, default):
+    """The client's file name reduced to safe characters, or `default` if nothing usable is left."""
+    name = re.sub(r"[^A-Za-z0-9._ -]", "_", os.path.basename(filename or "")).strip(" .")
+    return name or default
+
+class AskRequest(BaseModel):
+    user_id: str
+    query: str
+    # NDJSON events while the job waits and runs, with the answer streamed as
+    # "chunk" events. False returns one JSON body when the job is done.
+    progress: bool = True
+
+class Session:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        # Per-session so a dropped session's cleanup can't touch a newer
+        # session's files for the same user.
+        self.upload_dir = os.path.join(UPLOAD_DIR, user_id, uuid.uuid4().hex)
+        self.pdf_path = None
+        self.video_path = None
+        self.history = []
+        self.last_seen = time.time()
+        self.active_jobs = 0  # Queued or running
+        self.dropped = False
+
+    def to_dict(self, preprocessing=None):
+        return {
+            "user_id": self.user_id,
+            "pdf": os.path.basename(self.pdf_path) if self.pdf_path else None,
+            "pdf_preprocessing": preprocessing,
+            "video": os.path.basename(self.video_path) if self.video_path else None,
+            "history": self.history
+        }
+
+class Job:
+    def __init__(self, session, query, stream=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.session = session
+        self.query = query
+        self.stream = stream
+        self.events = asyncio.Queue()
+        self.enqueued_at = time.perf_counter()
+        self.cancelled = False
+
+class SwarmServer:
+    def __init__(self, manager, workers=4, queue_size=32):
+        self.manager = manager
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="swarm")
+        self.sessions = {}
+        self.busy = 0
+        self.completed = 0
+        self.rejected = 0
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._expire_sessions()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def session(self, user_id):
+        check_user_id(user_id)
+        if user_id not in self.sessions:
+            self.sessions[user_id] = Session(user_id)
+        session = self.sessions[user_id]
+        session.last_seen = time.time()
+        return session
+
+    def session_info(self, session):
+        preprocessing = None
+        if session.pdf_path:
+            preprocessing = self.manager.doc_agent.preprocessing_status(session.pdf_path)
+        return session.to_dict(preprocessing=preprocessing)
+
+    def queue_headers(self):
+        return {
+            "X-Queue-Depth": str(self.queue.qsize()),
+            "X-Queue-Capacity": str(self.queue.maxsize),
+            "X-Workers-Busy": str(self.busy),
+        }
+
+    def submit(self, session, query, stream=False):
+        """
+        Enqueues a job, or raises asyncio.QueueFull when the server is saturated.
+        """
+        job = Job(session, query, stream=stream)
+        self.queue.put_nowait(job)
+        session.active_jobs += 1
+        job.events.put_nowait({"event": "queued", "job_id": job.id, "position": self.queue.qsize()})
+        return job
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            if job.cancelled:
+                self._release(job.session)
+                self.queue.task_done()
+                continue
+            self.busy += 1
+            try:
+                await self._run_job(loop, job)
+            except Exception as e:
+                await job.events.put({"event": "error", "message": str(e)})
+            finally:
+                self.busy -= 1
+                self._release(job.session)
+                self.queue.task_done()
+
+    async def _run_job(self, loop, job):
+        session = job.session
+        started = time.perf_counter()
+        await job.events.put({"event": "started", "queue_seconds": round(started - job.enqueued_at, 3)})
+
+        # Follow-ups ("and its causes?") are rewritten into standalone
+        # questions from the session's recent turns before routing.
+        query = await loop.run_in_executor(
+            self.executor, self.manager.contextualize, job.query, session.history
+        )
+        route = await loop.run_in_executor(
+            self.executor, self.manager.route_query, query, session.pdf_path, session.video_path
+        )
+        await job.events.put({"event": "route", "route": route, "query": query})
+
+        images = []
+        if job.stream and route in STREAMED_ROUTES:
+            response = await loop.run_in_executor(self.executor, self._pump_stream, loop, job, route, query)
+        else:
+            # Non-streamed jobs go through execute_route, where identical
+            # concurrent questions are coalesced; the answer is one chunk.
+            response = await loop.run_in_executor(
+                self.executor, self.manager.execute_route, route, query, session.pdf_path, session.video_path
+            )
+            if isinstance(response, dict):
+                images = response.get("images", [])
+                response = response.get("text", "")
+            await job.events.put({"event": "chunk", "text": response})
+
+        for image in images:
+            await job.events.put({
+                "event": "image",
+                "mime_type": getattr(image, "mime_type", "image/png"),
+                "data": base64.b64encode(image.data).decode("ascii")
+            })
+
+        session.history = (session.history + [{"query": query, "route": route, "answer": response}])[-HISTORY_LENGTH:]
+        self.completed += 1
+        await job.events.put({
+            "event": "done",
+            "route": route,
+            "latency_seconds": round(time.perf_counter() - job.enqueued_at, 3)
+        })
+
+    def _pump_stream(self, loop, job, route, query):
+        """
+        Runs in a worker thread: forwards each model chunk to the client as it
+        arrives, and stops early if the client has gone. Returns the full text.
+        """
+        session = job.session
+        parts = []
+        stream = self.manager.execute_route_stream(route, query, session.pdf_path, session.video_path)
+        try:
+            for text in stream:
+                if job.cancelled:
+                    break
+                parts.append(text)
+                loop.call_soon_threadsafe(job.events.put_nowait, {"event": "chunk", "text": text})
+        finally:
+            stream.close()
+        return "".join(parts)
+
+    async def _expire_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            cutoff = time.time() - SESSION_TTL_SECONDS
+            for user_id in [u for u, s in self.sessions.items() if s.last_seen < cutoff and not s.active_jobs]:
+                self.drop_session(user_id)
+
+    def drop_session(self, user_id):
+        """
+        Forgets the session at once. Its uploads are deleted now, or after its
+        last queued or running job finishes.
+        """
+        check_user_id(user_id)
+        session = self.sessions.pop(user_id, None)
+        if session is None:
+            return
+        session.dropped = True
+        if not session.active_jobs:
+            shutil.rmtree(session.upload_dir, ignore_errors=True)
+
+    def _release(self, session):
+        session.active_jobs -= 1
+        if session.dropped and not session.active_jobs:
+            shutil.rmtree(session.upload_dir, ignore_errors=True)
+
+def create_app(manager, workers=4, queue_size=32):
+    swarm = SwarmServer(manager, workers=workers, queue_size=queue_size)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await swarm.start()
+        yield
+        await swarm.stop()
+
+    app = FastAPI(title="Study Swarm API", lifespan=lifespan)
+    app.state.swarm = swarm
+
+    @app.middleware("http")
+    async def add_queue_headers(request: Request, call_next):
+        response = await call_next(request)
+        response.headers.update(swarm.queue_headers())
+        return response
+
+    @app.get("/health")
+    async def health():
+        return {
+            "queue_depth": swarm.queue.qsize(),
+            "queue_capacity": swarm.queue.maxsize,
+            "workers": swarm.workers,
+            "workers_busy": swarm.busy,
+            "sessions": len(swarm.sessions),
+            "completed": swarm.completed,
+            "rejected": swarm.rejected,
+            "models": swarm.manager.policy.stats()
+        }
+
+    @app.post("/ask")
+    async def ask(body: AskRequest):
+        if not body.query.strip():
+            raise HTTPException(status_code=400, detail="Empty query.")
+        try:
+            job = swarm.submit(swarm.session(body.user_id), body.query, stream=body.progress)
+        except asyncio.QueueFull:
+            swarm.rejected += 1
+            # Rough estimate: seconds ~ queued jobs per worker.
+            return JSONResponse(
+                status_code=429,
+                content={"error": "Server busy, retry later.", "queue_depth": swarm.queue.qsize()},
+                headers={"Retry-After": str(max(1, swarm.queue.qsize() // swarm.workers))}
+            )
+
+        if body.progress:
+            return StreamingResponse(_progress_events(job), media_type="application/x-ndjson")
+
+        answer, route, latency = "", None, None
+        while True:
+            event = await job.events.get()
+            if event["event"] == "chunk":
+                answer += event["text"]
+            elif event["event"] == "error":
+                raise HTTPException(status_code=500, detail=event["message"])
+            elif event["event"] == "done":
+                route, latency = event["route"], event["latency_seconds"]
+                break
+        return {"job_id": job.id, "route": route, "answer": answer, "latency_seconds": latency}
+
+    async def _progress_events(job):
+        try:
+            while True:
+                event = await job.events.get()
+                yield json.dumps(event) + "\n"
+                if event["event"] in ("done", "error"):
+                    break
+        finally:
+            # Client went away: skip the job if a worker hasn't picked it up yet,
+            # or stop forwarding its stream.
+            job.cancelled = True
+
+    async def _save_upload(request, session, filename, max_bytes):
+        """
+        Streams the request body straight to disk, off the event loop, so a
+        large video is neither buffered nor copied twice. Uploads over
+        max_bytes get a 413 from Content-Length before any byte is read, or as
+        soon as the body passes the limit.
+
+        Each upload gets its own generated directory; the client's name is
+        kept (sanitized) only so answers and /sessions can show it.
+        """
+        too_large = HTTPException(status_code=413, detail=f"File exceeds {max_bytes // (1024 * 1024)} MB.")
+        declared = request.headers.get("content-length", "")
+        if declared.isdigit() and int(declared) > max_bytes:
+            raise too_large
+
+        upload_dir = os.path.join(session.upload_dir, uuid.uuid4().hex)
+        os.makedirs(upload_dir)
+        path = os.path.join(upload_dir, filename)
+        # Moved into place only when complete, so a rejected or dropped
+        # upload never leaves a half-written file behind.
+        partial_path = path + ".part"
+        written = 0
+        f = await run_in_threadpool(open, partial_path, "wb")
+        try:
+            async for chunk in request.stream():
+                written += len(chunk)
+                if written > max_bytes:
+                    raise too_large
+                await run_in_threadpool(f.write, chunk)
+            if not written:
+                raise HTTPException(status_code=400, detail="Empty upload.")
+        except BaseException:
+            await run_in_threadpool(f.close)
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            raise
+        await run_in_threadpool(f.close)
+        os.replace(partial_path, path)
+        return path
+
+    @app.post("/sessions/{user_id}/pdf")
+    async def upload_pdf(user_id: str, request: Request, filename: str = "document.pdf"):
+        session = swarm.session(user_id)
+        session.pdf_path = await _save_upload(request, session, display_name(filename, "document.pdf"), MAX_PDF_BYTES)
+        # Outline/summary/key terms are built in the background; poll GET /sessions/{id}.
+        swarm.manager.doc_agent.preload(session.pdf_path)
+        return swarm.session_info(session)
+
+    @app.post("/sessions/{user_id}/video")
+    async def upload_video(user_id: str, request: Request, filename: str = "video.mp4"):
+        session = swarm.session(user_id)
+        session.video_path = await _save_upload(request, session, display_name(filename, "video.mp4"), MAX_VIDEO_BYTES)
+        return swarm.session_info(session)
+
+    @app.get("/sessions/{user_id}")
+    async def get_session(user_id: str):
+        if user_id not in swarm.sessions:
+            raise HTTPException(status_code=404, detail="Unknown session.")
+        return swarm.session_info(swarm.sessions[user_id])
+
+    @app.delete("/sessions/{user_id}")
+    async def delete_session(user_id: str):
+        swarm.drop_session(user_id)
+        return {"deleted": user_id}
+
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Study Swarm HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4, help="Jobs processed concurrently.")
+    parser.add_argument("--queue-size", type=int, default=32, help="Pending jobs before answering 429.")
+    parser.add_argument("--mock", action="store_true", help="Use the local mock model backend.")
+    parser.add_argument("--mock-latency", type=float, default=0.5)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # Surfaces the per-prompt size logs from utils.prompt_builder.
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(name)s %(message)s")
+
+    client = None
+    if args.mock:
+        from utils.mock_client import MockClient
+        client = MockClient(latency=args.mock_latency, error_rate=args.mock_error_rate)
+
+    manager = StudyManager(client=client)
+    uvicorn.run(create_app(manager, workers=args.workers, queue_size=args.queue_size),
+                host=args.host, port=args.port)
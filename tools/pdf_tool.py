@@ -1,5 +1,18 @@
 import fitz  # PyMuPDF
 
+def read_pdf_pages(file_path: str) -> list:
+    """
+    Extracts the text of each page of a PDF.
+    
+    Args:
+        file_path: The exact path to the PDF file.
+        
+    Returns:
+        A list with one string per page. Raises if the file can't be read.
+    """
+    with fitz.open(file_path) as doc:
+        return [page.get_text() for page in doc]
+
 def read_pdf(file_path: str) -> str:
     """
     Reads a PDF file from the given path and extracts all its text.
@@ -11,14 +24,7 @@ def read_pdf(file_path: str) -> str:
         A string containing the full text of the PDF.
     """
     try:
-        # Open the document
-        doc = fitz.open(file_path)
-        text = ""
-        
         # Iterate over every page and extract text
-        for page in doc:
-            text += page.get_text() + "\n"
-            
-        return text
+        return "".join(page + "\n" for page in read_pdf_pages(file_path))
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
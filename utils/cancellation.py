@@ -0,0 +1,42 @@
+"""
+Cooperative cancellation for speculative agent runs.
+
+Agents take an optional `CancelToken` and call `checkpoint(cancel)` after
+their local preparation (reading the PDF, probing the video), right before
+each model call or upload. Cancelled work therefore stops before it costs
+anything, and the token records whether any call got through.
+"""
+import threading
+
+
+class Cancelled(Exception):
+    """Raised at a checkpoint once the work has been cancelled."""
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self.calls_started = 0
+
+    def cancel(self):
+        """Stops the work at its next checkpoint. Returns how many calls already got through."""
+        with self._lock:
+            self._event.set()
+            return self.calls_started
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        with self._lock:
+            if self._event.is_set():
+                raise Cancelled()
+            self.calls_started += 1
+
+
+def checkpoint(cancel):
+    """Raises Cancelled if `cancel` (a CancelToken or None) has been cancelled."""
+    if cancel is not None:
+        cancel.check()
@@ -0,0 +1,294 @@
+"""
+Background pre-processing for loaded PDFs.
+
+`DocPreprocessor.start()` is called when a PDF is loaded and returns at once.
+A worker thread then extracts the text, splits it into sections, builds an
+outline and a key-term list locally, and summarizes the sections (in
+parallel, on the light model tier) into an overall summary. `status()`
+reports the stage and progress for the UI.
+
+Generic first questions ("summarize this", "outline", "key terms") are then
+answered from these artifacts with no model call, and every later question
+reuses the extracted text instead of re-reading the file.
+"""
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.prompts import SECTION_SUMMARY_PROMPT, DOC_SUMMARY_PROMPT
+from utils import prompt_builder
+from utils.model_policy import default_policy
+from tools.pdf_tool import read_pdf_pages
+
+# Documents kept in memory (least recently loaded are dropped first).
+MAX_DOCUMENTS = 32
+# Used as sections when the text has no recognizable headings.
+PAGES_PER_CHUNK = 3
+# Shorter sections are folded into the previous one before summarizing.
+MIN_SECTION_CHARS = 400
+# Caps model calls per document; neighbouring sections are grouped beyond this.
+MAX_SUMMARY_SECTIONS = 24
+MAX_KEY_TERMS = 15
+
+HEADING_PATTERNS = [
+    re.compile(r"^(chapter|section|part|unit|lecture|module)\s+([0-9]+|[IVXLC]+)\b.{0,70}$", re.IGNORECASE),
+    re.compile(r"^\d+(\.\d+)*\.?\s+[A-Z][^.!?]{2,70}$"),   # "2.1 Cell Structure"
+    re.compile(r"^[A-Z][A-Z0-9 ,:&'-]{3,60}$"),            # "INTRODUCTION"
+]
+
+# Requests that precomputed artifacts can answer. A question qualifies only if,
+# once filler and references to the document are removed, nothing but one of
+# these phrases is left ("Summarize this PDF", "What are the key terms?").
+# Anything naming a topic ("Summarize the causes of World War I") goes to the model.
+QUICK_INTENTS = {
+    "summary": ("summarize", "summarise", "summary", "tldr"),
+    "outline": ("outline", "table contents"),  # "of" is filler
+    "key_terms": ("key terms", "keywords", "glossary"),
+}
+DOCUMENT_WORDS = set("pdf document doc file notes paper".split())
+FILLER_WORDS = set("""
+a an the this that these my our it its of in for to from me us please can could would you
+give show list write make provide what whats are is all main brief short quick
+provided uploaded attached given whole entire
+""".split())
+
+STOPWORDS = set("""
+a about above after again against all also among an and any are as at be because been before
+being below between both but by can could did do does doing down during each either few for
+from further had has have having here how however into its itself just many may might more
+most much must neither no nor not now of off often on once only other our out over own same
+shall should since some such than that the their them then there these they this those
+through thus to too under until upon very was were what when where whether which while who
+whom whose why will with within without would you your yours
+""".split())
+
+def file_key(pdf_path):
+    """Path plus mtime and size, so a re-uploaded file is processed again."""
+    try:
+        stat = os.stat(pdf_path)
+        return (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return (os.path.abspath(pdf_path),)
+
+def is_heading(line):
+    if not 3 <= len(line) <= 80 or not re.search(r"[A-Za-z]{2}", line):
+        return False
+    return any(pattern.match(line) for pattern in HEADING_PATTERNS)
+
+def split_sections(pages):
+    """
+    Splits page texts into [{'title', 'page', 'text'}] at detected headings,
+    falling back to groups of PAGES_PER_CHUNK pages.
+    """
+    sections = []
+    current = {"title": "Opening", "page": 1, "lines": []}
+    for page_number, page_text in enumerate(pages, start=1):
+        for raw_line in page_text.splitlines():
+            line = raw_line.strip()
+            if is_heading(line):
+                sections.append(current)
+                current = {"title": line, "page": page_number, "lines": []}
+            elif line:
+                current["lines"].append(line)
+    sections.append(current)
+
+    sections = [
+        {"title": s["title"], "page": s["page"], "text": "\n".join(s["lines"])}
+        for s in sections if s["lines"] or s["title"] != "Opening"
+    ]
+    if len(sections) >= 2:
+        return sections
+
+    return [
+        {
+            "title": f"Pages {start + 1}-{min(start + PAGES_PER_CHUNK, len(pages))}",
+            "page": start + 1,
+            "text": "\n".join(pages[start:start + PAGES_PER_CHUNK]).strip()
+        }
+        for start in range(0, len(pages), PAGES_PER_CHUNK)
+    ]
+
+def summary_units(sections):
+    """
+    Folds short sections into their predecessor, then groups neighbours so
+    there are at most MAX_SUMMARY_SECTIONS model calls.
+    """
+    units = []
+    for section in sections:
+        if units and len(section["text"]) < MIN_SECTION_CHARS:
+            units[-1]["text"] += f"\n{section['title']}\n{section['text']}"
+        else:
+            units.append({"title": section["title"], "page": section["page"], "text": section["text"]})
+    units = [u for u in units if u["text"].strip()]
+
+    if len(units) <= MAX_SUMMARY_SECTIONS:
+        return units
+    group = -(-len(units) // MAX_SUMMARY_SECTIONS)  # Ceiling division
+    return [
+        {
+            "title": " / ".join(u["title"] for u in units[i:i + group]),
+            "page": units[i]["page"],
+            "text": "\n".join(f"{u['title']}\n{u['text']}" for u in units[i:i + group])
+        }
+        for i in range(0, len(units), group)
+    ]
+
+def build_outline(sections):
+    return "\n".join(f"- {s['title']} (p. {s['page']})" for s in sections)
+
+def extract_key_terms(text, limit=MAX_KEY_TERMS):
+    """Most frequent capitalized phrases and content words, with counts."""
+    phrases = Counter()
+    for phrase in re.findall(r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+\b", text):
+        words = phrase.split()
+        while words and words[0].lower() in STOPWORDS:  # Sentence-initial "The", "In", ...
+            words.pop(0)
+        if len(words) >= 2:
+            phrases[" ".join(words)] += 1
+    words = Counter(
+        word.lower() for word in re.findall(r"[A-Za-z][A-Za-z-]{3,}", text)
+        if word.lower() not in STOPWORDS
+    )
+    # Multi-word names are rarer and more informative, so they rank double.
+    ranked = sorted([(2 * n, term, n) for term, n in phrases.items()] +
+                    [(n, term, n) for term, n in words.items()], reverse=True)
+    return [(term, count) for _, term, count in ranked[:limit] if count > 1]
+
+def detect_quick_intent(question):
+    """'summary', 'outline' or 'key_terms' for questions about the document itself, else None."""
+    words = re.findall(r"[a-z0-9]+", (question or "").lower().replace("tl;dr", "tldr"))
+    remainder = " ".join(w for w in words if w not in FILLER_WORDS and w not in DOCUMENT_WORDS)
+    if remainder == "about" and DOCUMENT_WORDS & set(words):
+        return "summary"  # "What is this document about?"
+    for intent, phrases in QUICK_INTENTS.items():
+        if remainder in phrases:
+            return intent
+    return None
+
+class DocPreprocessor:
+    """
+    Runs the pre-processing pipeline for each loaded PDF once (keyed by path,
+    mtime and size) in a background thread and holds the results.
+
+    Artifacts become available as each stage finishes: the text after
+    extraction, the outline and key terms after chunking, the summary last.
+    """
+    def __init__(self, client, policy=None, max_workers=2, summary_workers=4, max_documents=MAX_DOCUMENTS):
+        self.client = client
+        self.policy = policy or default_policy
+        self.max_documents = max_documents
+        # False sends every question to the model (e.g. for worst-case load tests).
+        self.quick_answers = True
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="doc-preprocess")
+        # Separate pool so a pipeline waiting on its sections can't starve them.
+        self._summary_pool = ThreadPoolExecutor(max_workers=summary_workers, thread_name_prefix="doc-summary")
+
+    def start(self, pdf_path):
+        """Queues pre-processing for the file unless it is already done or running."""
+        key = file_key(pdf_path)
+        with self._lock:
+            if key in self._docs:
+                self._docs.move_to_end(key)
+                return
+            state = {"stage": "queued", "progress": 0.0, "done": False, "error": None,
+                     "text": None, "outline": None, "key_terms": None, "sections": 0, "summary": None}
+            self._docs[key] = state
+            while len(self._docs) > self.max_documents:
+                self._docs.popitem(last=False)
+        self._executor.submit(self._run, pdf_path, state)
+
+    def status(self, pdf_path):
+        """{'stage', 'progress', 'done', 'error', 'sections'}, or None if never started."""
+        state = self._state(pdf_path)
+        if state is None:
+            return None
+        with self._lock:
+            return {k: state[k] for k in ("stage", "progress", "done", "error", "sections")}
+
+    def document_text(self, pdf_path):
+        """The extracted text (formatted like read_pdf), or None if not extracted yet."""
+        state = self._state(pdf_path)
+        return state["text"] if state else None
+
+    def quick_answer(self, pdf_path, question):
+        """An answer built from precomputed artifacts, or None if there isn't one yet."""
+        if not self.quick_answers:
+            return None
+        intent = detect_quick_intent(question)
+        state = self._state(pdf_path)
+        if intent is None or state is None:
+            return None
+        name = os.path.basename(pdf_path)
+
+        if intent == "outline" and state["outline"]:
+            return f"**Outline of {name}**\n\n{state['outline']}"
+        if intent == "key_terms" and state["key_terms"]:
+            terms = "\n".join(f"- **{term}** ({count} mentions)" for term, count in state["key_terms"])
+            return f"**Key terms in {name}**\n\n{terms}"
+        if intent == "summary" and state["summary"]:
+            return f"**Summary of {name}**\n\n{state['summary']}"
+        return None
+
+    def _state(self, pdf_path):
+        with self._lock:
+            return self._docs.get(file_key(pdf_path))
+
+    def _update(self, state, **changes):
+        with self._lock:
+            state.update(changes)
+
+    def _run(self, pdf_path, state):
+        try:
+            self._update(state, stage="extracting", progress=0.05)
+            pages = read_pdf_pages(pdf_path)
+            self._update(state, text="".join(page + "\n" for page in pages), progress=0.15)
+
+            self._update(state, stage="chunking")
+            sections = split_sections(pages)
+            units = summary_units(sections)
+            self._update(state, outline=build_outline(sections), key_terms=extract_key_terms(state["text"]),
+                         sections=len(units), progress=0.2)
+
+            if not units:
+                self._update(state, stage="ready", progress=1.0, done=True)  # No text to summarize
+                return
+
+            self._update(state, stage="summarizing")
+            notes = self._summarize_sections(units, state)
+
+            self._update(state, stage="summarizing document", progress=0.9)
+            prompt = prompt_builder.DOC_SUMMARY.build(system=DOC_SUMMARY_PROMPT, notes=notes)
+            summary = self.policy.generate(self.client, "preprocess", prompt).text
+            self._update(state, summary=summary, stage="ready", progress=1.0, done=True)
+        except Exception as e:
+            # Whatever finished is still used; questions fall back to the normal path.
+            self._update(state, stage="failed", error=str(e), done=True)
+
+    def _summarize_sections(self, units, state):
+        summaries = [None] * len(units)
+        futures = {
+            self._summary_pool.submit(self._summarize_section, unit): i
+            for i, unit in enumerate(units)
+        }
+        for finished, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            try:
+                summaries[i] = future.result()
+            except Exception as e:
+                summaries[i] = f"(Section could not be summarized: {e})"
+            self._update(state, progress=0.2 + 0.7 * finished / len(units))
+
+        return "\n\n".join(
+            f"{unit['title']} (p. {unit['page']}):\n{summary}"
+            for unit, summary in zip(units, summaries)
+        )
+
+    def _summarize_section(self, unit):
+        prompt = prompt_builder.SECTION_SUMMARY.build(
+            system=SECTION_SUMMARY_PROMPT, title=unit["title"], section=unit["text"]
+        )
+        return self.policy.generate(self.client, "preprocess", prompt).text
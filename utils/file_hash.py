@@ -0,0 +1,33 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# (abspath, mtime_ns, size) -> hash, so repeated lookups don't re-read the file.
+_hash_memo = OrderedDict()
+_hash_lock = threading.Lock()
+MAX_MEMOIZED_HASHES = 256
+
+def file_hash(file_path):
+    """
+    SHA-256 of the file contents, so renamed copies compare equal.
+    Memoized per path, mtime and size; a modified file is hashed again.
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            _hash_memo.move_to_end(memo_key)
+            return _hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    content_hash = digest.hexdigest()
+
+    with _hash_lock:
+        _hash_memo[memo_key] = content_hash
+        while len(_hash_memo) > MAX_MEMOIZED_HASHES:
+            _hash_memo.popitem(last=False)
+    return content_hash
@@ -0,0 +1,146 @@
+import json
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from google.genai import types
+from utils.prompts import LIVE_JUDGE_PROMPT
+from utils import prompt_builder
+from utils.prompt_builder import truncate_to_tokens
+from utils.model_policy import default_policy
+from utils.metrics_store import METRICS_FILE, record_judgment
+
+# Verdicts nobody collected (e.g. a closed browser tab) are dropped oldest-first.
+MAX_VERDICTS = 1000
+
+def _parse_verdicts(text):
+    """Maps item id -> verdict from the judge's JSON reply, or None if unparseable."""
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            parsed = [parsed]
+        return {str(g.get("id")): g for g in parsed}
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+class LiveJudge:
+    """
+    Grades answers off the request path.
+
+    `submit` only enqueues (or skips, per its `sample_rate`). A dispatcher
+    thread groups pending items into batches of up to `batch_size` (waiting
+    at most `batch_wait` seconds for a batch to fill) and grades each batch
+    with one structured model call on a small executor. Verdicts are held in
+    memory until the UI collects them with `pop_verdict` (at most
+    `max_verdicts`) and appended to the metrics store.
+
+    One instance can serve many users: batching is process-wide
+    configuration, while sampling is chosen per submission.
+    """
+    def __init__(self, client, policy=None, sample_rate=1.0, batch_size=4, batch_wait=1.5,
+                 max_workers=2, metrics_file=METRICS_FILE, max_verdicts=MAX_VERDICTS):
+        self.client = client
+        self.policy = policy or default_policy
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.metrics_file = metrics_file
+        self.max_verdicts = max_verdicts
+
+        self._pending = queue.Queue()
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="judge")
+        threading.Thread(target=self._dispatch, daemon=True, name="judge-dispatcher").start()
+
+    def submit(self, user_query, agent_response, sample_rate=None):
+        """
+        Queues a response for grading. Returns a judgment id, or None if this
+        turn was not sampled. sample_rate defaults to the instance's.
+        """
+        if sample_rate is None:
+            sample_rate = self.sample_rate
+        if random.random() >= sample_rate:
+            return None
+        judge_id = uuid.uuid4().hex[:8]
+        self._pending.put({
+            "id": judge_id,
+            "query": user_query,
+            "response": agent_response,
+            "submitted_at": time.time()
+        })
+        return judge_id
+
+    def get_verdict(self, judge_id):
+        """Returns {'score', 'reason'} once graded, else None."""
+        with self._lock:
+            return self._verdicts.get(judge_id)
+
+    def pop_verdict(self, judge_id):
+        """Like get_verdict, but hands the verdict over and forgets it."""
+        with self._lock:
+            return self._verdicts.pop(judge_id, None)
+
+    def _dispatch(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._judge_batch, batch)
+
+    def _judge_batch(self, batch):
+        # Budget each item separately so a long answer can't crowd out the others.
+        item_tokens = prompt_builder.LIVE_JUDGE.max_tokens // (len(batch) + 1)
+        items = "\n".join(
+            f'ITEM {item["id"]}:\n'
+            f'USER QUERY: "{truncate_to_tokens(str(item["query"]), item_tokens // 4)}"\n'
+            f'AGENT RESPONSE: "{truncate_to_tokens(str(item["response"]), item_tokens)}"\n'
+            for item in batch
+        )
+        model = None  # No model produced verdicts if the call failed
+        try:
+            # Light tier; escalate only if the verdicts can't be parsed.
+            eval_resp, tier = self.policy.generate_with_escalation(
+                self.client, "judge",
+                prompt_builder.LIVE_JUDGE.build(system=LIVE_JUDGE_PROMPT, items=items),
+                check=lambda text: _parse_verdicts(text) is not None,
+                config=types.GenerateContentConfig(response_mime_type="application/json"),
+                with_tier=True
+            )
+            model = self.policy.model_for("judge", tier)
+            graded = _parse_verdicts(eval_resp.text) or {}
+        except Exception:
+            graded = {}
+
+        for item in batch:
+            grade = graded.get(item["id"])
+            if grade:
+                verdict = {"score": grade.get("score"), "reason": grade.get("reason", "")}
+            else:
+                verdict = {"score": None, "reason": "Judge fell asleep."}
+
+            with self._lock:
+                self._verdicts[item["id"]] = verdict
+                while len(self._verdicts) > self.max_verdicts:
+                    self._verdicts.popitem(last=False)
+
+            record_judgment({
+                "id": item["id"],
+                "timestamp": time.time(),
+                "query": item["query"],
+                "score": verdict["score"],
+                "reason": verdict["reason"],
+                "batch_size": len(batch),
+                "wait_seconds": round(time.time() - item["submitted_at"], 2),
+                "model": model
+            }, self.metrics_file)
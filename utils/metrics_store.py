@@ -0,0 +1,29 @@
+import json
+import os
+import threading
+
+METRICS_FILE = "judge_metrics.jsonl"
+
+_lock = threading.Lock()
+
+def record_judgment(entry, metrics_file=METRICS_FILE):
+    """Appends one judge verdict as a JSON line (safe to call from worker threads)."""
+    with _lock:
+        with open(metrics_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+def load_judgments(metrics_file=METRICS_FILE):
+    if not os.path.exists(metrics_file):
+        return []
+    judgments = []
+    with open(metrics_file, "r") as f:
+        for line in f:
+            try:
+                judgments.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # Skip a half-written line
+    return judgments
+
+def average_score(judgments):
+    scores = [j["score"] for j in judgments if isinstance(j.get("score"), (int, float))]
+    return sum(scores) / len(scores) if scores else None
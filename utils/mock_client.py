@@ -0,0 +1,196 @@
+"""
+A local stand-in for `genai.Client` used by benchmarks and load tests.
+It mimics the small slice of the SDK the agents use (`models.generate_content`,
+`models.generate_content_stream`, `files.upload`, `files.get`) with
+configurable latency and 429 rates.
+"""
+import os
+import random
+import re
+import threading
+import time
+
+
+class MockPart:
+    def __init__(self, text):
+        self.text = text
+        self.executable_code = None
+        self.code_execution_result = None
+        self.inline_data = None
+
+
+class MockContent:
+    def __init__(self, text):
+        self.parts = [MockPart(text)]
+
+
+class MockCandidate:
+    def __init__(self, text):
+        self.content = MockContent(text)
+
+
+class MockUsage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+# Streamed replies: the first chunk arrives after this share of the latency.
+FIRST_CHUNK_SHARE = 0.3
+STREAM_CHUNK_WORDS = 5
+
+
+class MockResponse:
+    def __init__(self, text, prompt_text):
+        self.text = text
+        self.candidates = [MockCandidate(text)]
+        self.usage_metadata = MockUsage(len(prompt_text) // 4, len(text) // 4)
+
+
+class MockState:
+    def __init__(self, name):
+        self.name = name
+
+
+class MockFile:
+    def __init__(self, name, path, size_bytes):
+        self.name = name
+        self.path = path
+        self.size_bytes = size_bytes
+        self.state = MockState("ACTIVE")
+
+
+def flatten_contents(contents):
+    """Turns SDK-style contents (str, list of str/files) into one prompt string."""
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, (list, tuple)):
+        return "\n".join(flatten_contents(c) for c in contents)
+    if isinstance(contents, MockFile):
+        return f"[file:{contents.name}]"
+    return str(contents)
+
+
+def default_responder(prompt: str) -> str:
+    """Produces a plausible canned answer for the prompt shapes the swarm sends."""
+    lower = prompt.lower()
+    if "search, doc, video, code, or chat" in lower:
+        query = lower.split("user query:")[-1].split("return only")[0]
+        if "pdf" in query or "document" in query:
+            return "DOC"
+        if "video" in query:
+            return "VIDEO"
+        if "code" in query or "python" in query or "calculate" in query:
+            return "CODE"
+        if "hi" in query.split() or "hello" in query:
+            return "CHAT"
+        return "SEARCH"
+    if "rewritten query:" in lower:
+        # Follow-ups come back unchanged, so mock runs keep their original queries.
+        match = re.search(r'LAST USER INPUT: "(.*)"$', prompt, re.MULTILINE)
+        return match.group(1) if match else prompt
+    if "score:" in lower:
+        return "SCORE: 4\nREASON: Mock judge verdict."
+    return f"Mock answer ({len(prompt)} chars of input)."
+
+
+class _MockModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        prompt = flatten_contents(contents)
+        upload_seconds = sum(
+            c.size_bytes / 1_000_000 * self._client.per_mb_latency
+            for c in (contents if isinstance(contents, (list, tuple)) else [])
+            if isinstance(c, MockFile)
+        )
+        self._client._call(self._client.latency + upload_seconds)
+        return MockResponse(self._client.responder(prompt), prompt)
+
+    def generate_content_stream(self, model, contents, config=None):
+        """Yields the reply a few words at a time, spreading the latency over the chunks."""
+        prompt = flatten_contents(contents)
+        text = self._client.responder(prompt)
+        words = re.findall(r"\S+\s*", text) or [text]
+        chunks = ["".join(words[i:i + STREAM_CHUNK_WORDS]) for i in range(0, len(words), STREAM_CHUNK_WORDS)]
+        self._client._call(self._client.latency * FIRST_CHUNK_SHARE)
+        gap = self._client.latency * (1 - FIRST_CHUNK_SHARE) / max(len(chunks) - 1, 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(gap)
+            response = MockResponse(chunk, prompt)
+            # Like the SDK, the last chunk carries the usage for the whole call.
+            response.usage_metadata = MockUsage(len(prompt) // 4, len(text) // 4) if i == len(chunks) - 1 else None
+            yield response
+
+
+class _MockFiles:
+    def __init__(self, client):
+        self._client = client
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def upload(self, file):
+        size_bytes = os.path.getsize(file) if os.path.exists(file) else 0
+        self._client._call(self._client.upload_latency)
+        with self._lock:
+            name = f"files/mock-{len(self._files)}"
+            uploaded = MockFile(name, file, size_bytes)
+            self._files[name] = uploaded
+        return uploaded
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._files:
+                raise Exception(f"404 NOT_FOUND: {name}")
+            return self._files[name]
+
+
+class MockClient:
+    """
+    Drop-in replacement for `genai.Client` with no network access.
+
+    Args:
+        latency: Seconds each `generate_content` call sleeps.
+        upload_latency: Seconds each `files.upload` call sleeps.
+        per_mb_latency: Extra seconds per MB of uploaded file passed as content.
+        error_rate: Fraction of calls (0-1) that fail with a 429 error.
+        responder: Callable mapping the flattened prompt to the reply text.
+        jitter: Latency varies uniformly by +/- this fraction.
+        max_concurrency: Calls beyond this many in flight fail with 429,
+            like a provider quota. None = unlimited.
+    """
+    def __init__(self, latency=0.5, upload_latency=0.1, per_mb_latency=0.0,
+                 error_rate=0.0, responder=None, seed=None, jitter=0.0, max_concurrency=None):
+        self.latency = latency
+        self.upload_latency = upload_latency
+        self.per_mb_latency = per_mb_latency
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.responder = responder or default_responder
+        self.models = _MockModels(self)
+        self.files = _MockFiles(self)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+
+    def _call(self, seconds):
+        with self._lock:
+            self.calls += 1
+            if self.max_concurrency is not None and self.in_flight >= self.max_concurrency:
+                raise Exception("429 RESOURCE_EXHAUSTED: mock concurrency quota")
+            self.in_flight += 1
+            fail = self._random.random() < self.error_rate
+            if self.jitter:
+                seconds *= self._random.uniform(1 - self.jitter, 1 + self.jitter)
+        try:
+            time.sleep(seconds)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if fail:
+            raise Exception("429 RESOURCE_EXHAUSTED: mock rate limit")
@@ -0,0 +1,217 @@
+"""
+Model tiers for the swarm.
+
+Cheap, latency-sensitive steps (routing, query rewriting, judging) and
+background document pre-processing run on a light model; agents run on the
+standard model; a stronger model is used only when a confidence check or
+judge score fails. Each tier has its own timeout, and every call records
+per-tier latency and token usage.
+
+Tiers and task mapping can be overridden with a JSON file (default
+`model_tiers.json`, or the path in STUDY_SWARM_MODEL_TIERS):
+
+    {
+        "tiers": {"light": {"model": "gemini-2.0-flash-lite", "timeout": 10, "context": 1048576}},
+        "tasks": {"judge": "standard"}
+    }
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from google.genai import types
+
+MODEL_TIERS_FILE = os.getenv("STUDY_SWARM_MODEL_TIERS", "model_tiers.json")
+
+# timeout is in seconds; context is the model's input window in tokens.
+MODEL_TIERS = {
+    "light": {"model": "gemini-2.0-flash-lite", "timeout": 15, "context": 1_048_576},
+    "standard": {"model": "gemini-2.0-flash", "timeout": 120, "context": 1_048_576},
+    "strong": {"model": "gemini-2.5-pro", "timeout": 300, "context": 1_048_576},
+}
+DEFAULT_CONTEXT_TOKENS = 128_000
+# Prompt sizes are estimated at ~4 chars/token, which undercounts dense text
+# (code, numbers, non-English) by 25% or more, so prompts get only part of the window.
+CONTEXT_SAFETY_FACTOR = 0.8
+
+TASK_TIERS = {
+    "route": "light",
+    "rewrite": "light",
+    "judge": "light",
+    "preprocess": "light",
+    "chat": "standard",
+    "doc": "standard",
+    "search": "standard",
+    "code": "standard",
+    "video": "standard",
+}
+
+# Tasks whose inputs are large enough to need more than their tier's timeout.
+TASK_TIMEOUTS = {"video": 600}
+
+ESCALATION = {"light": "standard", "standard": "strong"}
+
+LATENCY_WINDOW = 500
+
+# Only the opening counts, so answers that mention a limitation later still pass.
+REFUSAL_PATTERN = re.compile(
+    r"^\W*(i'?m sorry|sorry, i\b|i (cannot|can't|can not)\b|i('m| am) (unable|not able)|as an ai\b)",
+    re.IGNORECASE
+)
+
+def is_refusal(text):
+    return bool(text and REFUSAL_PATTERN.match(text))
+
+def answer_check(text):
+    """Cheap confidence check for agent answers: not empty and not a refusal."""
+    return bool(text and text.strip()) and not is_refusal(text)
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class ModelPolicy:
+    def __init__(self, tiers=None, tasks=None, escalation=None, config_file=MODEL_TIERS_FILE):
+        self.tiers = {name: dict(conf) for name, conf in MODEL_TIERS.items()}
+        self.tasks = dict(TASK_TIERS)
+        self.escalation = dict(ESCALATION if escalation is None else escalation)
+
+        if config_file and os.path.exists(config_file):
+            with open(config_file, "r") as f:
+                overrides = json.load(f)
+            for name, conf in overrides.get("tiers", {}).items():
+                self.tiers.setdefault(name, {}).update(conf)
+            self.tasks.update(overrides.get("tasks", {}))
+        for name, conf in (tiers or {}).items():
+            self.tiers.setdefault(name, {}).update(conf)
+        self.tasks.update(tasks or {})
+
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def tier_for(self, task):
+        return self.tasks.get(task, "standard")
+
+    def model_for(self, task, tier=None):
+        return self.tiers[tier or self.tier_for(task)]["model"]
+
+    def prompt_budget(self, task, tier=None):
+        """Tokens a prompt for this task may use on its (or the given) tier's model."""
+        context = self.tiers[tier or self.tier_for(task)].get("context", DEFAULT_CONTEXT_TOKENS)
+        return int(context * CONTEXT_SAFETY_FACTOR)
+
+    def generate(self, client, task, contents, config=None, tier=None):
+        """
+        generate_content on the task's tier (or an explicit tier), with that
+        tier's timeout. Records latency, tokens and errors.
+        """
+        tier = tier or self.tier_for(task)
+        start = time.perf_counter()
+        try:
+            response = client.models.generate_content(
+                model=self.tiers[tier]["model"],
+                contents=contents,
+                config=self._config(task, tier, config)
+            )
+        except Exception:
+            self._record(tier, task, time.perf_counter() - start, error=True)
+            raise
+        self._record(tier, task, time.perf_counter() - start, usage=getattr(response, "usage_metadata", None))
+        return response
+
+    def generate_stream(self, client, task, contents, config=None, tier=None):
+        """
+        Like generate, but yields the reply's text chunks as the model produces
+        them (generate_content_stream). Stats are recorded when the stream ends.
+        """
+        tier = tier or self.tier_for(task)
+        start = time.perf_counter()
+        usage = None
+        try:
+            for chunk in client.models.generate_content_stream(
+                model=self.tiers[tier]["model"],
+                contents=contents,
+                config=self._config(task, tier, config)
+            ):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if chunk.text:
+                    yield chunk.text
+        except Exception:
+            self._record(tier, task, time.perf_counter() - start, error=True)
+            raise
+        self._record(tier, task, time.perf_counter() - start, usage=usage)
+
+    def _config(self, task, tier, config):
+        """The caller's config with the tier's (or task's) timeout applied."""
+        timeout = TASK_TIMEOUTS.get(task, self.tiers[tier]["timeout"])
+        http_options = types.HttpOptions(timeout=int(timeout * 1000))
+        if config is None:
+            return types.GenerateContentConfig(http_options=http_options)
+        return config.model_copy(update={"http_options": http_options})
+
+    def generate_with_escalation(self, client, task, contents, check, config=None, tier=None, with_tier=False):
+        """
+        Like generate, but if check(response.text) is False, retries one tier
+        up until the check passes or no stronger tier is left. The last
+        response is returned even if it never passed, as (response, tier) when
+        with_tier=True. Call errors (429s, timeouts) are raised on the current
+        tier, not escalated.
+        """
+        tier = tier or self.tier_for(task)
+        while True:
+            response = self.generate(client, task, contents, config=config, tier=tier)
+            if check(response.text) or tier not in self.escalation:
+                return (response, tier) if with_tier else response
+            self.record_escalation(tier, task)
+            tier = self.escalation[tier]
+
+    def record_escalation(self, tier, task):
+        with self._lock:
+            self._tier_stats(tier)["escalations"] += 1
+
+    def _tier_stats(self, tier):
+        if tier not in self._stats:
+            self._stats[tier] = {
+                "calls": 0, "errors": 0, "escalations": 0,
+                "prompt_tokens": 0, "output_tokens": 0,
+                "latencies": deque(maxlen=LATENCY_WINDOW), "tasks": {}
+            }
+        return self._stats[tier]
+
+    def _record(self, tier, task, seconds, usage=None, error=False):
+        with self._lock:
+            stats = self._tier_stats(tier)
+            stats["calls"] += 1
+            stats["tasks"][task] = stats["tasks"].get(task, 0) + 1
+            stats["latencies"].append(seconds)
+            if error:
+                stats["errors"] += 1
+            if usage is not None:
+                stats["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+                stats["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+
+    def stats(self):
+        """Per-tier summary: calls, errors, escalations, tokens and latency percentiles."""
+        with self._lock:
+            summary = {}
+            for tier, stats in self._stats.items():
+                latencies = list(stats["latencies"])
+                summary[tier] = {
+                    "model": self.tiers[tier]["model"],
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "escalations": stats["escalations"],
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "output_tokens": stats["output_tokens"],
+                    "p50_seconds": _percentile(latencies, 50),
+                    "p95_seconds": _percentile(latencies, 95),
+                    "tasks": dict(stats["tasks"])
+                }
+            return summary
+
+# Shared by every agent in the process so stats cover the whole swarm.
+default_policy = ModelPolicy()
@@ -0,0 +1,194 @@
+"""
+Prompt assembly with token budgets.
+
+Templates from utils/prompts.py are compiled once at import. Each {field} is
+tagged with a section role, and `build()` fills the roles in priority order
+(system > question > context > history > memory), so when a prompt would be
+over budget the least important sections are truncated first. Every
+assembled prompt's size is logged to the "study_swarm.prompts" logger.
+"""
+import logging
+import math
+from string import Formatter
+
+from utils import prompts
+
+logger = logging.getLogger("study_swarm.prompts")
+
+# Gemini averages ~4 characters per token for English text. Good enough for
+# budgeting and orders of magnitude cheaper than calling count_tokens.
+CHARS_PER_TOKEN = 4
+
+# Highest priority first.
+PRIORITY = ("system", "question", "context", "history", "memory")
+
+# Which end of a section survives truncation.
+KEEP = {
+    "system": "head",
+    "question": "head",
+    "context": "head",   # Start of the document / notes
+    "history": "tail",   # Most recent turns
+    "memory": "tail",    # Most recently learned facts
+}
+
+# Default per-section caps in tokens (None = only limited by the total).
+SECTION_BUDGETS = {
+    "system": None,
+    "question": 2_000,
+    "context": None,
+    "history": 2_000,
+    "memory": 500,
+}
+
+TRUNCATION_MARKER = "\n[... truncated ...]\n"
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def truncate_to_tokens(text, max_tokens, keep="head"):
+    """
+    Cuts text to about max_tokens, on a line boundary when one is close,
+    keeping the start (keep='head') or the end (keep='tail').
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER)
+    if max_chars <= 0:
+        return ""
+
+    if keep == "tail":
+        kept = text[-max_chars:]
+        newline = kept.find("\n")
+        if 0 <= newline < len(kept) // 2:
+            kept = kept[newline + 1:]
+        return TRUNCATION_MARKER.lstrip("\n") + kept
+
+    kept = text[:max_chars]
+    newline = kept.rfind("\n")
+    if newline > len(kept) // 2:
+        kept = kept[:newline]
+    return kept + TRUNCATION_MARKER.rstrip("\n")
+
+class PromptTemplate:
+    """
+    A template compiled once into literal chunks and {field} slots.
+
+    Args:
+        name: Used in size logs.
+        text: Template with str.format-style fields.
+        roles: Maps field -> section role (see PRIORITY). Fields without a
+            role are short metadata (file names, criteria) and never truncated.
+        max_tokens: Default total budget for the assembled prompt.
+        budgets: Per-role caps overriding SECTION_BUDGETS.
+    """
+    def __init__(self, name, text, roles, max_tokens, budgets=None):
+        self.name = name
+        self.roles = roles
+        self.max_tokens = max_tokens
+        self.budgets = {**SECTION_BUDGETS, **(budgets or {})}
+
+        self._chunks = []
+        self.fields = []
+        for literal, field, _, _ in Formatter().parse(text):
+            if literal:
+                self._chunks.append((literal, None))
+            if field is not None:
+                self._chunks.append((None, field))
+                self.fields.append(field)
+        self._literal_tokens = estimate_tokens("".join(l for l, _ in self._chunks if l))
+
+    def build(self, max_tokens=None, budgets=None, **sections):
+        """
+        Fills the template, truncating sections in reverse priority order so
+        the result fits max_tokens. Returns the prompt string.
+        """
+        return self.build_with_report(max_tokens, budgets, **sections)[0]
+
+    def build_with_report(self, max_tokens=None, budgets=None, **sections):
+        """
+        Like build, but returns (prompt, truncated) where truncated maps each
+        field that was cut to (kept_chars, original_chars), so callers can
+        tell the user how much was used.
+        """
+        missing = [f for f in self.fields if f not in sections]
+        if missing:
+            raise KeyError(f"Prompt '{self.name}' is missing sections: {missing}")
+
+        total_budget = max_tokens or self.max_tokens
+        caps = {**self.budgets, **(budgets or {})}
+        values = {f: "" if sections[f] is None else str(sections[f]) for f in self.fields}
+
+        remaining = total_budget - self._literal_tokens
+        for field in self.fields:
+            if field not in self.roles:
+                remaining -= estimate_tokens(values[field])
+
+        sizes = {}
+        truncated = {}
+        ordered = sorted((f for f in self.fields if f in self.roles),
+                         key=lambda f: PRIORITY.index(self.roles[f]))
+        for field in ordered:
+            role = self.roles[field]
+            allowed = max(remaining, 0)
+            if caps.get(role) is not None:
+                allowed = min(allowed, caps[role])
+            if role == "system":
+                allowed = max(allowed, estimate_tokens(values[field]))  # Never cut instructions
+            original = values[field]
+            values[field] = truncate_to_tokens(original, allowed, KEEP[role])
+            if values[field] != original:
+                # truncate_to_tokens adds the marker minus one of its newlines.
+                kept = max(len(values[field]) - (len(TRUNCATION_MARKER) - 1), 0)
+                truncated[field] = (kept, len(original))
+            sizes[field] = estimate_tokens(values[field])
+            remaining -= sizes[field]
+
+        prompt = "".join(literal if literal is not None else values[field]
+                         for literal, field in self._chunks)
+        logger.info("prompt=%s tokens~%d budget=%d sections=%s truncated=%s",
+                    self.name, estimate_tokens(prompt), total_budget, sizes, list(truncated) or "-")
+        return prompt, truncated
+
+# --- Precompiled templates ---
+ROUTER = PromptTemplate("router", prompts.ROUTER_TEMPLATE,
+                        roles={"question": "question"}, max_tokens=1_000,
+                        budgets={"question": 500})
+
+REWRITE = PromptTemplate("rewrite", prompts.REWRITE_TEMPLATE,
+                         roles={"question": "question", "history": "history"}, max_tokens=2_000,
+                         budgets={"question": 500, "history": 1_200})
+
+CHAT = PromptTemplate("chat", prompts.CHAT_TEMPLATE,
+                      roles={"question": "question", "memory": "memory"}, max_tokens=4_000)
+
+BRIEF_CHAT = PromptTemplate("brief_chat", prompts.BRIEF_CHAT_TEMPLATE,
+                            roles={"question": "question"}, max_tokens=2_000)
+
+# Callers pass the model's budget (ModelPolicy.prompt_budget); this is a fallback.
+DOC_QA = PromptTemplate("doc_qa", prompts.DOC_QA_TEMPLATE,
+                        roles={"system": "system", "question": "question", "document": "context"},
+                        max_tokens=200_000)
+
+VIDEO_NOTES_QA = PromptTemplate("video_notes_qa", prompts.VIDEO_NOTES_QA_TEMPLATE,
+                                roles={"system": "system", "question": "question", "notes": "context"},
+                                max_tokens=100_000)
+
+LIVE_JUDGE = PromptTemplate("live_judge", prompts.LIVE_JUDGE_TEMPLATE,
+                            roles={"system": "system", "items": "context"}, max_tokens=16_000)
+
+EVAL_JUDGE = PromptTemplate("eval_judge", prompts.EVAL_JUDGE_TEMPLATE,
+                            roles={"question": "question", "response": "context"}, max_tokens=8_000)
+
+SECTION_SUMMARY = PromptTemplate("section_summary", prompts.SECTION_SUMMARY_TEMPLATE,
+                                 roles={"system": "system", "section": "context"}, max_tokens=12_000)
+
+DOC_SUMMARY = PromptTemplate("doc_summary", prompts.DOC_SUMMARY_TEMPLATE,
+                             roles={"system": "system", "notes": "context"}, max_tokens=16_000)
+
+def format_history(messages):
+    return "\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+
+def format_facts(facts):
+    return "\n".join(f"- {fact}" for fact in facts) if facts else "(none)"
@@ -0,0 +1,73 @@
+import re
+import threading
+from concurrent.futures import CancelledError, Future
+
+def normalize_query(text):
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r"\s+", " ", text.strip().lower()).rstrip(" ?!.")
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls (across threads) into one upstream call.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for the same result or exception. Nothing is cached: once
+    the call finishes, the next caller starts a fresh one.
+
+    Cancellation: a waiter that times out simply stops waiting (the shared call
+    keeps running for the others). If the leader is cancelled (KeyboardInterrupt,
+    CancelledError), waiters are not failed with it; one of them retries as the
+    new leader.
+
+    Set `enabled = False` to run every call (e.g. for worst-case load tests).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+        self.enabled = True
+
+    def do(self, key, fn, *args, timeout=None, **kwargs):
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._calls[key] = future
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                return self._lead(key, future, fn, *args, **kwargs)
+
+            try:
+                return future.result(timeout=timeout)
+            except CancelledError:
+                continue  # Leader was cancelled; try again ourselves.
+
+    def _lead(self, key, future, fn, *args, **kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except (KeyboardInterrupt, CancelledError):
+            self._finish(key)
+            future.cancel()
+            raise
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key):
+        # Unregister before resolving so late callers start a fresh call.
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,36 @@
+import json
+import os
+import threading
+
+VIDEO_CACHE_FILE = "video_cache.json"
+
+_lock = threading.Lock()
+
+def segment_key(video_hash, start, end):
+    return f"{video_hash}:{start:.0f}-{end:.0f}"
+
+def load_video_cache(cache_file=VIDEO_CACHE_FILE):
+    if not os.path.exists(cache_file):
+        return {"segments": {}}
+    try:
+        with open(cache_file, "r") as f:
+            data = json.load(f)
+            if "segments" not in data: data["segments"] = {}
+            return data
+    except:
+        return {"segments": {}}
+
+def get_segment_summary(video_hash, start, end, cache_file=VIDEO_CACHE_FILE):
+    data = load_video_cache(cache_file)
+    return data["segments"].get(segment_key(video_hash, start, end))
+
+def save_segment_summary(video_hash, start, end, summary, cache_file=VIDEO_CACHE_FILE):
+    with _lock:
+        data = load_video_cache(cache_file)
+        data["segments"][segment_key(video_hash, start, end)] = {
+            "start": start,
+            "end": end,
+            "summary": summary
+        }
+        with open(cache_file, "w") as f:
+            json.dump(data, f, indent=4)